@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark: legacy str-based injection vs. the mmap engine in css_inject.py.
+
+Each implementation runs in a fresh interpreter on fresh copies of the pages,
+so peak RSS (ru_maxrss) is not polluted by the other run.
+
+Usage: python3 bench_inject.py [--repeat N] [PAGE ...]
+Default pages: the largest pages of the app.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+DEFAULT_PAGES = [
+    "kalkulation.html",
+    "annahme.html",
+    "kanban.html",
+    "partner-app/kva-erstellen.html"
+]
+
+IMPLEMENTATIONS = ['noop', 'legacy', 'mmap']
+
+
+def legacy_insert(file_path, css):
+    """Reference copy of the original insert_css_before_last_style_close"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    last_style_close = content.rfind('</style>')
+    if last_style_close == -1:
+        return False
+
+    new_content = content[:last_style_close] + css + '\n    ' + content[last_style_close:]
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(new_content)
+
+    return True
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def worker(impl, files):
+    """Runs inside the child interpreter; prints a JSON result line"""
+    sys.path.insert(0, SCRIPT_DIR)
+    from css_inject import inject_before_last_style_close
+    from insert_mobile_css import MOBILE_CSS, MOBILE_CSS_BLOCK
+
+    start = time.perf_counter()
+    for file_path in files:
+        if impl == 'legacy':
+            legacy_insert(file_path, MOBILE_CSS)
+        elif impl == 'mmap':
+            inject_before_last_style_close(file_path, MOBILE_CSS_BLOCK)
+    wall = time.perf_counter() - start
+
+    print(json.dumps({'impl': impl, 'wall_s': wall, 'peak_rss_kb': peak_rss_kb()}))
+
+
+def run_once(impl, pages, workdir):
+    copies = []
+    for i, page in enumerate(pages):
+        target = os.path.join(workdir, f"{i}_{os.path.basename(page)}")
+        shutil.copyfile(page, target)
+        copies.append(target)
+
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', impl] + copies,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark HTML CSS injection")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--worker', choices=IMPLEMENTATIONS, help=argparse.SUPPRESS)
+    parser.add_argument('pages', nargs='*')
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker, args.pages)
+        return 0
+
+    pages = args.pages or [os.path.join(REPO_ROOT, p) for p in DEFAULT_PAGES]
+    pages = [p for p in pages if os.path.exists(p)]
+    total_mb = sum(os.path.getsize(p) for p in pages) / (1024 * 1024)
+
+    print(f"📏 {len(pages)} pages, {total_mb:.2f} MB, {args.repeat} runs each")
+    print("=" * 60)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for impl in IMPLEMENTATIONS:
+            runs = [run_once(impl, pages, workdir) for _ in range(args.repeat)]
+            results[impl] = {
+                'wall_s': min(r['wall_s'] for r in runs),
+                'peak_rss_kb': max(r['peak_rss_kb'] for r in runs)
+            }
+
+    baseline = results['noop']['peak_rss_kb']
+    print(f"{'impl':<8} {'best wall':>12} {'MB/s':>10} {'peak RSS':>12} {'Δ vs noop':>12}")
+    for impl in ('legacy', 'mmap'):
+        r = results[impl]
+        mb_s = total_mb / r['wall_s'] if r['wall_s'] else float('inf')
+        print(f"{impl:<8} {r['wall_s'] * 1000:>10.1f}ms {mb_s:>10.1f} "
+              f"{r['peak_rss_kb'] / 1024:>10.1f}MB {(r['peak_rss_kb'] - baseline) / 1024:>10.1f}MB")
+
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,262 @@
+"""
+Critical-CSS split for inline <style> blocks in <head>.
+
+The fold is the markup from <body> to the end of the page header and of
+the first .wizard-step (at least FOLD_MIN_BYTES of markup). Rules whose
+selectors can match an element of the fold stay inline in <head>. That
+includes rules inside the @media (max-width: 768px/480px) mobile blocks, so
+tablets paint with their mobile layout. @import/@charset/@namespace and
+@font-face always stay. @media print and everything else goes.
+
+Each head <style> block becomes:
+
+    <style data-critical>critical subset</style>
+    <link rel="stylesheet" href="css/deferred/<page>.<n>.<hash>.css" media="print" onload="this.media='all'" data-deferred>
+    <noscript><link rel="stylesheet" href="css/deferred/<page>.<n>.<hash>.css"></noscript>
+
+The deferred sheet holds the complete original block (relative url()s
+rewritten for the sheet's location), not just the rest: it comes after the
+critical subset in the cascade, so once it has loaded the page is styled
+exactly as before, whatever the rule order was.
+"""
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+
+from css_rules import find_style_blocks, format_rules, parse_rules
+from css_usage import collect_markup_names, prune_selector
+
+DEFERRED_DIR = os.path.join("css", "deferred")
+DEFERRED_MARK_RE = re.compile(r'<link\b[^>]*\bdata-deferred\b', re.IGNORECASE)
+# The same for raw bytes (mmap scans)
+DEFERRED_MARK_BYTES_RE = re.compile(DEFERRED_MARK_RE.pattern.encode('ascii'), re.IGNORECASE)
+
+# Markup below <body> that always counts as above the fold
+FOLD_MIN_BYTES = 4096
+
+BODY_SCAN_RE = re.compile(r'<(!--|script\b|style\b|body\b)', re.IGNORECASE)
+SKIP_RE = re.compile(r'<script\b.*?(?:</script\s*>|$)|<style\b.*?(?:</style\s*>|$)|<!--.*?(?:-->|$)',
+                     re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r'<(/?)([a-zA-Z][\w-]*)\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+CLASS_ATTR_RE = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+HTML_TAG_RE = re.compile(r'<html\b[^>]*>', re.IGNORECASE)
+# url(...) tokens; quoted strings are matched too so url()s inside them (data: URIs) stay untouched
+URL_RE = re.compile(r'url\(\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^\'")\s]+)\s*\)'
+                    r'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'', re.IGNORECASE)
+MARKER_RE = re.compile(r'/\* mobile-css:[0-9a-f]+ \*/')
+
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+                       'source', 'track', 'wbr'])
+ALWAYS_CRITICAL_AT_RULES = ('@import', '@charset', '@namespace', '@font-face')
+
+
+@dataclass
+class CriticalSplit:
+    html: str               # rewritten page
+    sheets: list            # [(path, css)] deferred stylesheets to write
+    blocking_before: int    # bytes of inline head CSS before
+    blocking_after: int     # bytes of critical CSS left inline
+    fold: str               # what ended the fold ('header', 'wizard-step', 'min-bytes')
+
+
+def find_body(html):
+    """Offset of the <body> tag (outside scripts/comments), or -1"""
+    pos = 0
+    while True:
+        m = BODY_SCAN_RE.search(html, pos)
+        if m is None:
+            return -1
+        tag = m.group(1).lower()
+        if tag == 'body':
+            return m.start()
+        if tag == '!--':
+            end = html.find('-->', m.end())
+        else:
+            end = html.lower().find(f'</{tag}', m.end())
+        if end == -1:
+            return -1
+        pos = end + 1
+
+
+def element_end(html, start):
+    """Offset after the element whose start tag begins at html[start]"""
+    open_tag = TAG_RE.match(html, start)
+    if open_tag is None:
+        return start + 1
+    name = open_tag.group(2).lower()
+    if name in VOID_TAGS or open_tag.group(0).endswith('/>'):
+        return open_tag.end()
+
+    depth = 0
+    pos = start
+    while True:
+        m = TAG_RE.search(html, pos)
+        if m is None:
+            return len(html)
+        tag = m.group(2).lower()
+        if tag in ('script', 'style') and not m.group(1) and tag != name:
+            close = html.lower().find(f'</{tag}', m.end())
+            pos = len(html) if close == -1 else close + 1
+            continue
+        if tag == name:
+            depth += -1 if m.group(1) else 1
+            if depth == 0:
+                return m.end()
+        pos = m.end()
+
+
+def _markup_spans(html, start, end):
+    """(start, end) spans of html[start:end] outside scripts, styles and comments"""
+    spans = []
+    pos = start
+    for m in SKIP_RE.finditer(html, start, end):
+        spans.append((pos, m.start()))
+        pos = m.end()
+    spans.append((pos, end))
+    return spans
+
+
+def _first_element(html, spans, predicate):
+    for span_start, span_end in spans:
+        for m in TAG_RE.finditer(html, span_start, span_end):
+            if not m.group(1) and predicate(m):
+                return m.start()
+    return -1
+
+
+def _classes(tag_match):
+    attr = CLASS_ATTR_RE.search(tag_match.group(0))
+    return (attr.group(1) or attr.group(2) or '').split() if attr else []
+
+
+def _is_header(tag_match):
+    if tag_match.group(2).lower() == 'header':
+        return True
+    return any(c == 'header' or c.endswith('-header') for c in _classes(tag_match))
+
+
+def _is_wizard_step(tag_match):
+    return 'wizard-step' in _classes(tag_match)
+
+
+def fold_region(html, body_start, min_bytes=FOLD_MIN_BYTES):
+    """(end offset, reason) of the above-the-fold markup starting at <body>"""
+    spans = _markup_spans(html, body_start, len(html))
+    end, reason = min(len(html), body_start + min_bytes), 'min-bytes'
+    for name, predicate in (('header', _is_header), ('wizard-step', _is_wizard_step)):
+        start = _first_element(html, spans, predicate)
+        if start != -1 and element_end(html, start) > end:
+            end, reason = element_end(html, start), name
+    return end, reason
+
+
+def fold_names(html, body_start, fold_end):
+    """Names in the fold markup (plus the <html> tag's own attributes)"""
+    markup = ''.join(html[s:e] for s, e in _markup_spans(html, body_start, fold_end))
+    names = collect_markup_names(markup)
+    html_tag = HTML_TAG_RE.search(html, 0, body_start)
+    if html_tag:
+        collect_markup_names(html_tag.group(0), names)
+    return names
+
+
+def critical_rules(css, start, end, names):
+    """Rules of css[start:end] needed for the first paint, selectors pruned to the fold"""
+    rules, _ = parse_rules(css, start, end)
+    critical = []
+    for rule in rules:
+        if rule.media.startswith('@media print'):
+            continue
+        if rule.opaque:
+            if rule.selector.lower().startswith(ALWAYS_CRITICAL_AT_RULES):
+                critical.append(rule)
+            continue
+        selector = prune_selector(rule.selector, names)
+        if selector:
+            rule.selector = selector
+            critical.append(rule)
+    return critical
+
+
+def rebase_urls(css, from_dir, to_dir):
+    """Rewrite relative url()s written for from_dir so they work from to_dir"""
+    def rebase(m):
+        token = m.group(1)
+        if token is None:
+            return m.group(0)  # string literal
+        quote = token[0] if token[0] in '"\'' else ''
+        url = token[1:-1] if quote else token
+        if not url or url.startswith(('data:', '#', '/')) or '://' in url:
+            return m.group(0)
+        target = os.path.normpath(os.path.join(from_dir, url))
+        return f"url({quote}{os.path.relpath(target, to_dir).replace(os.sep, '/')}{quote})"
+    return URL_RE.sub(rebase, css)
+
+
+def split_critical(html, page_path, min_bytes=FOLD_MIN_BYTES):
+    """CriticalSplit for a page, or None if it has no inline head CSS"""
+    body_start = find_body(html)
+    if body_start == -1:
+        return None
+    blocks = [b for b in find_style_blocks(html)
+              if b.tag_start < body_start and 'media=' not in b.attrs.lower()]
+    if not blocks:
+        return None
+
+    fold_end, reason = fold_region(html, body_start, min_bytes)
+    names = fold_names(html, body_start, fold_end)
+
+    page_dir = os.path.dirname(os.path.abspath(page_path))
+    sheet_dir = os.path.join(page_dir, DEFERRED_DIR)
+    stem = os.path.splitext(os.path.basename(page_path))[0]
+
+    out = []
+    sheets = []
+    pos = 0
+    blocking_before = blocking_after = 0
+    for n, block in enumerate(blocks):
+        css = html[block.start:block.end]
+        critical = critical_rules(html, block.start, block.end, names)
+
+        line_start = html.rfind('\n', 0, block.tag_start) + 1
+        indent = html[line_start:block.tag_start] if not html[line_start:block.tag_start].strip() else ''
+        close_end = html.index('>', block.end) + 1
+
+        # Re-runs of the mobile CSS injection look for its marker in the page
+        lines = MARKER_RE.findall(css) + (format_rules(critical).splitlines() if critical else [])
+        critical_css = '\n' + ''.join(f"{indent}    {line}\n" for line in lines) if lines else ''
+
+        sheet_css = rebase_urls(css, page_dir, sheet_dir).strip('\n') + '\n'
+        digest = hashlib.sha256(sheet_css.encode('utf-8')).hexdigest()[:10]
+        sheet_path = os.path.join(sheet_dir, f"{stem}.{n}.{digest}.css")
+        href = os.path.relpath(sheet_path, page_dir).replace(os.sep, '/')
+        sheets.append((sheet_path, sheet_css))
+
+        parts = []
+        if critical_css:
+            parts.append(f"<style{block.attrs} data-critical>{critical_css}{indent}</style>\n{indent}")
+        parts.append(f'<link rel="stylesheet" href="{href}" media="print" onload="this.media=\'all\'" data-deferred>\n'
+                     f'{indent}<noscript><link rel="stylesheet" href="{href}"></noscript>')
+
+        out.append(html[pos:block.tag_start])
+        out.append(''.join(parts))
+        pos = close_end
+        blocking_before += len(css.encode('utf-8'))
+        blocking_after += len(critical_css.encode('utf-8'))
+    out.append(html[pos:])
+
+    return CriticalSplit(''.join(out), sheets, blocking_before, blocking_after, reason)
+
+
+def stale_sheets(page_path, keep):
+    """Deferred sheets of an earlier split of this page that are not in keep"""
+    sheet_dir = os.path.join(os.path.dirname(os.path.abspath(page_path)), DEFERRED_DIR)
+    if not os.path.isdir(sheet_dir):
+        return []
+    stem = os.path.splitext(os.path.basename(page_path))[0]
+    pattern = re.compile(re.escape(stem) + r'\.\d+\.[0-9a-f]{10}\.css$')
+    keep = {os.path.abspath(p) for p in keep}
+    return [os.path.join(sheet_dir, name) for name in sorted(os.listdir(sheet_dir))
+            if pattern.match(name) and os.path.join(sheet_dir, name) not in keep]
@@ -0,0 +1,103 @@
+"""
+Memory-mapped injection engine for large HTML pages.
+
+The insertion point is the end of the last real <style> block, found with
+css_rules.find_style_blocks() so </style> strings inside <script> (print
+templates, CSS in template literals) and HTML comments are ignored. The
+scan runs its bytes regexes directly over the memory-mapped file (no copy
+of the page), and the result is written as head + snippet + tail straight
+from the mapping. Output goes to a temp file in the same
+directory which is then renamed over the original, so an interrupted run
+never leaves a half-written page behind.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import nullcontext
+
+from css_rules import find_style_blocks
+
+
+def _open_map(f):
+    """Map an open file read-only; returns None for empty files (mmap can't map 0 bytes)"""
+    if os.fstat(f.fileno()).st_size == 0:
+        return None
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def file_search(file_path, pattern):
+    """True if the compiled bytes regex matches anywhere in the file, via mmap"""
+    with open(file_path, 'rb') as f:
+        mm = _open_map(f)
+        if mm is None:
+            return False
+        with mm:
+            return pattern.search(mm) is not None
+
+
+def atomic_write_parts(file_path, parts):
+    """Write the given byte chunks to file_path via temp file + rename"""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for part in parts:
+                out.write(part)
+            out.flush()
+            os.fsync(out.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, tmp_path)
+        else:
+            # mkstemp creates 0600; new files get the usual umask-based mode
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _no_timer(name):
+    return nullcontext()
+
+
+def inject_before_last_style_close(file_path, snippet, skip_if_contains=(), before_write=None, timer=None):
+    """Insert snippet (bytes) before the </style> of the last real <style> block.
+
+    skip_if_contains: byte strings; if any of them is already inside one of
+    the page's <style> blocks, nothing is written.
+    before_write: called as before_write(file_path, view) with a read-only
+    view of the original content right before the file is replaced
+    (used for backups).
+    timer: optional codemod_profile.PhaseTimer. Pages are mapped lazily, so
+    'read' is only open + mmap; faulting the pages in counts towards 'scan'.
+
+    Returns 'updated', 'skipped' or 'no-style'.
+    """
+    timer = timer or _no_timer
+    with open(file_path, 'rb') as f:
+        with timer('read'):
+            mm = _open_map(f)
+        if mm is None:
+            return 'no-style'
+        with mm:
+            with timer('scan'):
+                blocks = find_style_blocks(mm)
+                found = any(mm.find(needle, b.start, b.end) != -1
+                            for b in blocks for needle in skip_if_contains)
+            if found:
+                return 'skipped'
+            if not blocks:
+                return 'no-style'
+            offset = blocks[-1].end
+
+            with memoryview(mm) as view, timer('write'):
+                if before_write is not None:
+                    before_write(file_path, view)
+                atomic_write_parts(file_path, (view[:offset], snippet, view[offset:]))
+
+    return 'updated'
@@ -0,0 +1,300 @@
+"""
+Minimal CSS/HTML helpers for the CSS build scripts.
+
+- find_style_blocks(): inline <style> blocks of a page, ignoring <style>
+  strings inside <script> (print templates etc.) and HTML comments. Also
+  runs on bytes/mmap (offsets are then byte offsets, without a copy).
+- parse_rules(): flat list of rules with offsets. @media/@supports blocks are
+  descended into, so each inner rule carries its media context; other
+  at-rules (@keyframes, @font-face, ...) are kept as one opaque unit.
+- Normalization helpers so identical rules hash identically regardless of
+  whitespace and comments.
+"""
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+STYLE_OPEN_RE = re.compile(r'<style\b([^>]*)>', re.IGNORECASE)
+STYLE_CLOSE_RE = re.compile(r'</style\s*>', re.IGNORECASE)
+SCRIPT_CLOSE_RE = re.compile(r'</script\s*>', re.IGNORECASE)
+TAG_START_RE = re.compile(r'<(!--|script\b|style\b)', re.IGNORECASE)
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+WS_RE = re.compile(r'\s+')
+SELECTOR_COMBINATOR_RE = re.compile(r'\s*([,>+~])\s*')
+SPECIAL_RE = re.compile(r'[{};"\'/]')
+
+# find_style_blocks() patterns for str and for bytes-like pages (mmap)
+_BLOCK_RES = (TAG_START_RE, STYLE_OPEN_RE, STYLE_CLOSE_RE, SCRIPT_CLOSE_RE)
+_BLOCK_BYTES_RES = tuple(re.compile(p.pattern.encode('ascii'), p.flags & re.IGNORECASE) for p in _BLOCK_RES)
+
+# At-rules whose body is a list of rules
+GROUPING_AT_RULES = ('@media', '@supports')
+
+
+@dataclass
+class StyleBlock:
+    tag_start: int      # offset of '<style'
+    start: int          # offset of the CSS text (after '>')
+    end: int            # offset of '</style>'
+    attrs: str          # raw attributes of the <style> tag
+
+
+@dataclass
+class CssRule:
+    media: str          # normalized enclosing @media/@supports prelude, '' at top level
+    selector: str       # normalized selector (or at-rule prelude for opaque rules)
+    declarations: str   # normalized declaration block (or whole body for opaque rules)
+    start: int          # offset of the rule text in the parsed string
+    end: int            # offset after the closing '}' (or ';')
+    opaque: bool = False  # at-rule kept as a unit (@keyframes, @font-face, @import, ...)
+    group: int = -1     # index of the enclosing @media rule in the group list, -1 = none
+
+    @property
+    def key(self):
+        return f"{self.media}|{self.selector}{{{self.declarations}}}"
+
+    @property
+    def digest(self):
+        return hashlib.sha256(self.key.encode('utf-8')).hexdigest()
+
+
+@dataclass
+class CssGroup:
+    prelude: str        # normalized '@media ...' prelude
+    start: int
+    end: int
+    body_start: int
+    body_end: int
+
+
+def find_style_blocks(html):
+    """Inline <style> blocks of a page (str, bytes or mmap) in document order"""
+    text = isinstance(html, str)
+    tag_start_re, style_open_re, style_close_re, script_close_re = _BLOCK_RES if text else _BLOCK_BYTES_RES
+    comment_close = '-->' if text else b'-->'
+    blocks = []
+    pos = 0
+    while True:
+        m = tag_start_re.search(html, pos)
+        if m is None:
+            return blocks
+        tag = m.group(1)[:2].lower()
+        if tag in ('!-', b'!-'):
+            end = html.find(comment_close, m.end())
+            pos = len(html) if end == -1 else end + 3
+        elif tag in ('sc', b'sc'):
+            close = script_close_re.search(html, m.end())
+            pos = len(html) if close is None else close.end()
+        else:
+            open_m = style_open_re.match(html, m.start())
+            if open_m is None:
+                pos = m.end()
+                continue
+            close = style_close_re.search(html, open_m.end())
+            if close is None:
+                return blocks
+            attrs = open_m.group(1) if text else open_m.group(1).decode('latin-1')
+            blocks.append(StyleBlock(m.start(), open_m.end(), close.start(), attrs))
+            pos = close.end()
+
+
+def _skip_string_or_comment(css, i):
+    """If css[i] starts a string or comment, return the offset after it, else None"""
+    ch = css[i]
+    if ch in '"\'':
+        j = i + 1
+        while j < len(css) and css[j] != ch:
+            j += 2 if css[j] == '\\' else 1
+        return min(j + 1, len(css))
+    if css.startswith('/*', i):
+        end = css.find('*/', i + 2)
+        return len(css) if end == -1 else end + 2
+    return None
+
+
+def _match_brace(css, i):
+    """Offset of the '}' matching the '{' at css[i]"""
+    depth = 0
+    while True:
+        m = SPECIAL_RE.search(css, i)
+        if m is None:
+            return len(css)
+        i = m.start()
+        skip = _skip_string_or_comment(css, i)
+        if skip is not None:
+            i = skip
+            continue
+        if css[i] == '{':
+            depth += 1
+        elif css[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+
+
+def _statements(css, start, end):
+    """Top-level statements in css[start:end] as (stmt_start, prelude_end, body_end, stmt_end)
+
+    body_end is -1 for block-less statements like '@import ...;'.
+    """
+    i = start
+    while i < end:
+        if css[i].isspace():
+            i += 1
+            continue
+        skip = _skip_string_or_comment(css, i)
+        if skip is not None and css.startswith('/*', i):
+            i = skip
+            continue
+        stmt_start = i
+        while i < end:
+            m = SPECIAL_RE.search(css, i, end)
+            if m is None:
+                i = end
+                break
+            i = m.start()
+            skip = _skip_string_or_comment(css, i)
+            if skip is not None:
+                i = skip
+                continue
+            if css[i] in '{;}':
+                break
+            i += 1
+        if i >= end:
+            return
+        if css[i] == '{':
+            close = min(_match_brace(css, i), end)
+            yield stmt_start, i, close, close + 1
+            i = close + 1
+        elif css[i] == ';':
+            yield stmt_start, i, -1, i + 1
+            i += 1
+        else:
+            i += 1  # stray '}'
+
+
+def normalize_selector(selector):
+    selector = WS_RE.sub(' ', COMMENT_RE.sub('', selector)).strip()
+    return SELECTOR_COMBINATOR_RE.sub(r'\1', selector)
+
+
+def normalize_prelude(prelude):
+    # Only the at-keyword is case-insensitive (@keyframes names are not)
+    prelude = WS_RE.sub(' ', COMMENT_RE.sub('', prelude)).strip()
+    prelude = re.sub(r'^@[\w-]+', lambda m: m.group(0).lower(), prelude)
+    prelude = re.sub(r'\(\s+', '(', re.sub(r'\s+\)', ')', prelude))
+    prelude = re.sub(r'\s*([:,])\s*', r'\1', prelude)
+    return re.sub(r'^(@[\w-]+)\s*\(', r'\1 (', prelude)
+
+
+def split_declarations(body):
+    """Split a declaration block on ';' outside strings and parentheses"""
+    parts = []
+    depth = 0
+    current = []
+    i = 0
+    while i < len(body):
+        skip = _skip_string_or_comment(body, i)
+        if skip is not None:
+            if not body.startswith('/*', i):
+                current.append(body[i:skip])
+            i = skip
+            continue
+        ch = body[i]
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ';' and depth == 0:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+        i += 1
+    parts.append(''.join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def property_families(declarations):
+    """{(family, important)} of a normalized declaration block.
+
+    The family is the property name up to its first '-' after any vendor
+    prefix, so shorthands and their longhands (margin / margin-top,
+    background / background-color) share one. Custom properties keep their
+    full name.
+    """
+    families = set()
+    for decl in split_declarations(declarations):
+        prop, _, value = decl.partition(':')
+        if not prop.startswith('--'):
+            prop = re.sub(r'^-\w+-', '', prop).split('-')[0]
+        families.add((prop, value.rstrip().endswith('!important')))
+    return families
+
+
+def normalize_declarations(body):
+    decls = []
+    for decl in split_declarations(body):
+        prop, sep, value = decl.partition(':')
+        decls.append(prop.strip().lower() + sep + WS_RE.sub(' ', value).strip())
+    return ';'.join(decls)
+
+
+def parse_rules(css, start=0, end=None):
+    """Parse css[start:end] into (rules, groups)"""
+    end = len(css) if end is None else end
+    rules = []
+    groups = []
+
+    for stmt_start, prelude_end, body_end, stmt_end in _statements(css, start, end):
+        prelude = css[stmt_start:prelude_end]
+        lowered = prelude.lstrip().lower()
+
+        if body_end != -1 and lowered.startswith(GROUPING_AT_RULES):
+            group = CssGroup(normalize_prelude(prelude), stmt_start, stmt_end, prelude_end + 1, body_end)
+            groups.append(group)
+            for s, p, b, e in _statements(css, prelude_end + 1, body_end):
+                inner_prelude = css[s:p]
+                if b == -1 or inner_prelude.lstrip().startswith('@'):
+                    body = css[p + 1:b] if b != -1 else ''
+                    rules.append(CssRule(group.prelude, normalize_prelude(inner_prelude),
+                                         WS_RE.sub(' ', COMMENT_RE.sub('', body)).strip(), s, e,
+                                         opaque=True, group=len(groups) - 1))
+                else:
+                    rules.append(CssRule(group.prelude, normalize_selector(inner_prelude),
+                                         normalize_declarations(css[p + 1:b]), s, e, group=len(groups) - 1))
+        elif lowered.startswith('@'):
+            body = css[prelude_end + 1:body_end] if body_end != -1 else ''
+            rules.append(CssRule('', normalize_prelude(prelude),
+                                 WS_RE.sub(' ', COMMENT_RE.sub('', body)).strip(), stmt_start, stmt_end, opaque=True))
+        else:
+            rules.append(CssRule('', normalize_selector(prelude),
+                                 normalize_declarations(css[prelude_end + 1:body_end]), stmt_start, stmt_end))
+
+    return rules, groups
+
+
+def format_rules(rules, indent='    '):
+    """Serialize normalized rules, merging consecutive rules with the same media"""
+    lines = []
+    current_media = None
+    for rule in rules:
+        if rule.media != current_media:
+            if current_media:
+                lines.append('}')
+            if rule.media:
+                lines.append(f"{rule.media} {{")
+            current_media = rule.media
+        pad = indent if rule.media else ''
+        if rule.opaque and not rule.declarations:
+            lines.append(f"{pad}{rule.selector};")
+        elif rule.opaque:
+            lines.append(f"{pad}{rule.selector} {{ {rule.declarations} }}")
+        else:
+            decls = '; '.join(split_declarations(rule.declarations))
+            lines.append(f"{pad}{rule.selector} {{ {decls}; }}" if decls else f"{pad}{rule.selector} {{ }}")
+    if current_media:
+        lines.append('}')
+    return '\n'.join(lines) + '\n'
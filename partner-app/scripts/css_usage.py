@@ -0,0 +1,229 @@
+"""
+Selector usage analysis for inline CSS.
+
+collect_names() gathers the tag, class and id names a page can contain: from
+its markup, from every quoted string in its inline scripts (classList.add,
+innerHTML templates, querySelector, ...) and from the local scripts it loads
+via <script src>. The analysis is deliberately conservative: anything that
+might be a class or id counts as used, and selectors that cannot be parsed
+are treated as matching.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+
+from css_rules import parse_rules
+
+TAG_RE = re.compile(r'<([a-zA-Z][\w-]*)')
+ATTR_RE = re.compile(r'\b(class|id)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+SCRIPT_SRC_RE = re.compile(r'\bsrc\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+STRING_RE = re.compile(r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`(?:[^`\\]|\\.)*`', re.DOTALL)
+WORD_RE = re.compile(r'-?[A-Za-z_][\w-]*')
+
+# Simple selector parts
+COMPOUND_SPLIT_RE = re.compile(r'\s*[>+~]\s*|\s+')
+CLASS_RE = re.compile(r'\.(-?[A-Za-z_][\w-]*)')
+ID_RE = re.compile(r'#(-?[A-Za-z_][\w-]*)')
+LEADING_TAG_RE = re.compile(r'^([A-Za-z][\w-]*)')
+PSEUDO_ARG_RE = re.compile(r'::?[\w-]+\((?:[^()]|\([^()]*\))*\)')
+PSEUDO_RE = re.compile(r'::?[\w-]+')
+ATTR_SELECTOR_RE = re.compile(r'\[[^\]]*\]')
+NAME_RE = re.compile(r'-?(?:[\w-]|\\.)+')
+
+# Pseudo-classes whose specificity is that of their most specific argument
+PSEUDO_FORWARD = frozenset(['not', 'is', 'matches', 'has', '-webkit-any', '-moz-any'])
+# Pseudo-elements that may be written with a single colon
+LEGACY_PSEUDO_ELEMENTS = frozenset(['before', 'after', 'first-line', 'first-letter'])
+
+# Always present in a rendered page
+IMPLICIT_TAGS = frozenset(['html', 'head', 'body'])
+
+
+@dataclass
+class PageNames:
+    tags: set = field(default_factory=set)
+    classes: set = field(default_factory=set)
+    ids: set = field(default_factory=set)
+    # Words from script strings: may be classes or ids
+    words: set = field(default_factory=set)
+
+    def has_class(self, name):
+        return name in self.classes or name in self.words
+
+    def has_id(self, name):
+        return name in self.ids or name in self.words
+
+    def has_tag(self, name):
+        name = name.lower()
+        return name == '*' or name in IMPLICIT_TAGS or name in self.tags
+
+
+def _add_markup(names, text):
+    names.tags.update(t.lower() for t in TAG_RE.findall(text))
+    for attr, dq, sq in ATTR_RE.findall(text):
+        values = (dq or sq).split()
+        (names.classes if attr.lower() == 'class' else names.ids).update(values)
+
+
+def _add_script_strings(names, source):
+    for literal in STRING_RE.findall(source):
+        names.words.update(WORD_RE.findall(literal))
+        _add_markup(names, literal)
+
+
+def collect_markup_names(markup, names=None):
+    """Tag/class/id names of a markup fragment only (no scripts)"""
+    names = names or PageNames()
+    _add_markup(names, markup)
+    return names
+
+
+def collect_names(html, page_dir=None):
+    """Tag/class/id names used by a page (markup, inline and local scripts)"""
+    names = PageNames()
+    _add_markup(names, html)
+
+    for attrs, body in SCRIPT_RE.findall(html):
+        _add_script_strings(names, body)
+        src = SCRIPT_SRC_RE.search(attrs)
+        if src and page_dir and '://' not in src.group(1) and not src.group(1).startswith('//'):
+            path = os.path.normpath(os.path.join(page_dir, src.group(1).split('?')[0]))
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    _add_script_strings(names, f.read())
+
+    return names
+
+
+def split_selector_list(selector):
+    """Split 'a, b:not(c, d)' on top-level commas"""
+    parts = []
+    depth = 0
+    current = []
+    for ch in selector:
+        if ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    parts.append(''.join(current).strip())
+    return [p for p in parts if p]
+
+
+def _paren_end(selector, i):
+    """Offset after the ')' matching the '(' at selector[i]"""
+    depth = 0
+    while i < len(selector):
+        ch = selector[i]
+        if ch in '"\'':
+            end = selector.find(ch, i + 1)
+            i = len(selector) if end == -1 else end
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(selector)
+
+
+def specificity(selector):
+    """(ids, classes, types) of a complex selector (no top-level commas)"""
+    a = b = c = 0
+    i = 0
+    n = len(selector)
+    while i < n:
+        ch = selector[i]
+        if ch in '#.':
+            m = NAME_RE.match(selector, i + 1)
+            if ch == '#':
+                a += 1
+            else:
+                b += 1
+            i = m.end() if m else i + 1
+        elif ch == '[':
+            end = selector.find(']', i)
+            b += 1
+            i = n if end == -1 else end + 1
+        elif ch == ':':
+            element = selector.startswith('::', i)
+            m = NAME_RE.match(selector, i + (2 if element else 1))
+            name = m.group(0).lower() if m else ''
+            i = m.end() if m else i + 1
+            args = ''
+            if i < n and selector[i] == '(':
+                end = _paren_end(selector, i)
+                args = selector[i + 1:end - 1]
+                i = end
+            if element or name in LEGACY_PSEUDO_ELEMENTS:
+                c += 1
+            elif name in PSEUDO_FORWARD:
+                best = max((specificity(s) for s in split_selector_list(args)), default=(0, 0, 0))
+                a, b, c = a + best[0], b + best[1], c + best[2]
+            elif name != 'where':
+                b += 1
+        elif ch.isalpha() or ch == '_':
+            m = NAME_RE.match(selector, i)
+            c += 1
+            i = m.end()
+        else:
+            i += 1  # combinators, whitespace, '*'
+    return a, b, c
+
+
+def complex_selector_can_match(selector, names):
+    """False only if some compound needs a tag/class/id the page never uses"""
+    stripped = PSEUDO_RE.sub('', PSEUDO_ARG_RE.sub('', ATTR_SELECTOR_RE.sub('', selector)))
+    for compound in COMPOUND_SPLIT_RE.split(stripped.strip()):
+        if not compound:
+            continue
+        tag = LEADING_TAG_RE.match(compound)
+        if tag and not names.has_tag(tag.group(1)):
+            return False
+        if not all(names.has_class(c) for c in CLASS_RE.findall(compound)):
+            return False
+        if not all(names.has_id(i) for i in ID_RE.findall(compound)):
+            return False
+    return True
+
+
+def prune_selector(selector, names):
+    """The parts of a selector list that can match, joined again ('' if none)"""
+    return ','.join(s for s in split_selector_list(selector) if complex_selector_can_match(s, names))
+
+
+def prune_rules(rules, names, existing_keys=()):
+    """Rules (from parse_rules) reduced to what can match the page.
+
+    Opaque at-rules are kept; rules whose key is in existing_keys (already in
+    the page's inline CSS) are dropped.
+    """
+    kept = []
+    for rule in rules:
+        if rule.key in existing_keys:
+            continue
+        if rule.opaque:
+            kept.append(rule)
+            continue
+        selector = prune_selector(rule.selector, names)
+        if selector:
+            rule.selector = selector
+            if rule.key not in existing_keys:
+                kept.append(rule)
+    return kept
+
+
+def dead_rules(html, blocks, names):
+    """Inline rules of the page whose selector cannot match anything in it"""
+    dead = []
+    for block in blocks:
+        rules, _ = parse_rules(html, block.start, block.end)
+        dead.extend(r for r in rules if not r.opaque and not prune_selector(r.selector, names))
+    return dead
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Extract CSS rules shared between pages into cacheable external stylesheets.
+
+Parses every inline <style> block, normalizes and hashes each rule (inner
+@media rules individually) and moves rules that occur in at least
+--min-pages pages of the same directory into shared stylesheets. Rules are
+grouped by the exact set of pages that use them: each group becomes one
+<dir>/css/inline-shared.<hash>.css and only the pages of that set link it,
+so no page receives a rule it did not have. The <link>s go right before
+the page's first affected <style> block; page-specific rules stay inline.
+
+Cascade order: the shared sheets are loaded before the inline rules they
+were taken from. A rule is only extracted if its selector occurs once in the
+page - across all media contexts, <style media=...> blocks and the sheets
+the page already links - and if no other rule that sets a property of the
+same family (margin / margin-top) with the same !important and specificity
+would change order with it. Such pairs keep their rules inline.
+
+url()s are rebased from the page directory to css/ when a rule moves into
+a sheet.
+
+Re-runs are additive: rules from the currently linked sheets stay
+extracted, new shared rules are added, and sheets are regrouped and
+relinked by content hash.
+
+Usage: python3 extract_css.py [--root DIR] [--min-pages N] [--min-sheet-bytes N] [--write] [--no-backup] [PATTERN ...]
+Without --write only the report is printed. With --write, rewritten pages and
+replaced sheets are snapshotted into the backup store first
+(python3 scripts/backup_store.py restore latest undoes the run).
+"""
+
+import argparse
+import glob
+import hashlib
+import heapq
+import os
+import re
+import sys
+from collections import defaultdict
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(SCRIPT_DIR))
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'scripts'))
+
+from backup_store import BackupStore
+from css_critical import rebase_urls
+from css_inject import atomic_write_parts
+from css_rules import find_style_blocks, format_rules, parse_rules, property_families
+from css_usage import specificity, split_selector_list
+from html_pages import BATCH_PATTERNS, collect_batch_files
+
+SHEET_DIR = "css"
+SHEET_PREFIX = "inline-shared."
+SHARED_LINK_RE = re.compile(
+    r'<link rel="stylesheet" href="((?:[^"]*/)?' + SHEET_DIR + r'/' + re.escape(SHEET_PREFIX) + r'[0-9a-f]+\.css)">')
+
+# Never moved out of the page
+PINNED_AT_RULES = ('@import', '@charset', '@namespace')
+
+
+class Page:
+    """An HTML page with its inline rules"""
+
+    def __init__(self, path):
+        self.path = path
+        self.dir = os.path.dirname(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            self.html = f.read()
+
+        # (block, rule) for every rule of the blocks without media=, in document order
+        self.blocks = []
+        self.rules = []
+        self.groups = []
+        # Every inline rule, <style media=...> blocks included
+        self.inline_rules = []
+        for block in find_style_blocks(self.html):
+            rules, groups = parse_rules(self.html, block.start, block.end)
+            self.inline_rules.extend(rules)
+            if 'media=' in block.attrs.lower():
+                continue
+            block_index = len(self.blocks)
+            self.blocks.append(block)
+            offset = len(self.groups)
+            self.groups.extend(groups)
+            for rule in rules:
+                if rule.group != -1:
+                    rule.group += offset
+                self.rules.append((block_index, rule))
+
+        links = list(SHARED_LINK_RE.finditer(self.html))
+        self.link_start = links[0].start() if links else None
+        self.linked_sheets = [os.path.normpath(os.path.join(self.dir, m.group(1))) for m in links]
+
+        # Rules already moved into the linked sheets, with url()s as written
+        # in the page and their (link offset, index) position in the cascade
+        self.linked_rules = []
+        self.linked_order = []
+        for m, sheet in zip(links, self.linked_sheets):
+            if os.path.exists(sheet):
+                with open(sheet, 'r', encoding='utf-8') as f:
+                    css = rebase_urls(f.read(), os.path.dirname(sheet), self.dir)
+                for rule in parse_rules(css)[0]:
+                    self.linked_order.append((m.start(), len(self.linked_rules)))
+                    self.linked_rules.append(rule)
+
+        # Selector counts over every media context, <style media=...> blocks included
+        self.selector_count = defaultdict(int)
+        for rule in self.inline_rules + self.linked_rules:
+            self.selector_count[rule.selector] += 1
+
+    def extractable(self):
+        """Rules that can move into a sheet loaded earlier without changing the cascade"""
+        return [(b, r) for b, r in self.rules
+                if self.selector_count[r.selector] == 1
+                and not (r.opaque and r.selector.startswith(PINNED_AT_RULES))]
+
+
+def _line_span(html, start, end):
+    """Widen [start, end) to whole lines if nothing else is on them"""
+    s = start
+    while s > 0 and html[s - 1] in ' \t':
+        s -= 1
+    e = end
+    while e < len(html) and html[e] in ' \t':
+        e += 1
+    if (s == 0 or html[s - 1] == '\n') and (e == len(html) or html[e] == '\n'):
+        return s, min(e + 1, len(html))
+    return start, end
+
+
+def _cascade_keys(rule, cache):
+    """(property family, !important, specificity) triples a rule competes on"""
+    if rule.opaque:
+        return ()
+    keys = cache.get((rule.selector, rule.declarations))
+    if keys is None:
+        specs = {specificity(s) for s in split_selector_list(rule.selector)}
+        keys = [(family, important, spec)
+                for family, important in property_families(rule.declarations) for spec in specs]
+        cache[(rule.selector, rule.declarations)] = keys
+    return keys
+
+
+def cascade_conflicts(page, extracted, sheet_keys, cache):
+    """Keys of rules that would change order with a competing rule.
+
+    sheet_keys: rule keys of the sheets the page will link, in cascade order.
+    The sheets replace the first existing shared <link> or go before the
+    first block an extracted rule comes from; rules inline after that point
+    now follow every sheet rule. Of each flipped pair the extracted rule is
+    returned, or the linked rules if regrouping the sheets flipped them.
+    """
+    if page.link_start is not None:
+        anchor = page.link_start
+    elif extracted:
+        anchor = page.blocks[extracted[0][0]].tag_start
+    else:
+        return set()
+    sheet_index = {key: i for i, key in enumerate(sheet_keys)}
+    moved = {rule.key for _, rule in extracted}
+
+    # (rule, position before, position after, 'extracted' / 'inline' / 'linked')
+    entries = []
+    for rule in page.inline_rules:
+        if rule.key in moved:
+            entries.append((rule, (rule.start, 0), (anchor, sheet_index[rule.key]), 'extracted'))
+        else:
+            entries.append((rule, (rule.start, 0), (rule.start, 0), 'inline'))
+    for rule, old in zip(page.linked_rules, page.linked_order):
+        if rule.key in sheet_index:
+            entries.append((rule, old, (anchor, sheet_index[rule.key]), 'linked'))
+
+    competing = defaultdict(list)
+    for entry in entries:
+        for key in _cascade_keys(entry[0], cache):
+            competing[key].append(entry)
+
+    conflicts = set()
+    for bucket in competing.values():
+        movers = [e for e in bucket if e[1] != e[2]]
+        for a in movers:
+            for b in bucket:
+                if a is b or (a[1] < b[1]) == (a[2] < b[2]):
+                    continue
+                if 'extracted' in (a[3], b[3]):
+                    # Keeping one of the two inline restores their order
+                    if not (a[0].key in conflicts or b[0].key in conflicts):
+                        conflicts.add(a[0].key if a[3] == 'extracted' else b[0].key)
+                else:
+                    conflicts.update(e[0].key for e in (a, b) if e[3] == 'linked')
+    return conflicts
+
+
+def _merged_order(sequences):
+    """Items of all sequences, in an order that keeps each sequence's own order where they agree"""
+    rank = {}
+    after = defaultdict(set)
+    pending = defaultdict(int)
+    for sequence in sequences:
+        for item in sequence:
+            rank.setdefault(item, len(rank))
+        for a, b in zip(sequence, sequence[1:]):
+            if b not in after[a]:
+                after[a].add(b)
+                pending[b] += 1
+
+    ready = [(rank[item], item) for item in rank if not pending[item]]
+    heapq.heapify(ready)
+    order = []
+    while ready:
+        _, item = heapq.heappop(ready)
+        order.append(item)
+        for b in after[item]:
+            pending[b] -= 1
+            if not pending[b]:
+                heapq.heappush(ready, (rank[b], b))
+    # Sequences that disagree leave a cycle; its items keep first-seen order
+    placed = set(order)
+    return order + [item for item in rank if item not in placed]
+
+
+def plan_directory(pages, min_pages, min_bytes=0):
+    """Group the shareable rules of the pages in one directory by the pages using them.
+
+    Returns (groups, extracted): groups is a list of (page paths, rules), one
+    per sheet, in first-use order; extracted maps each page to its inline
+    (block, rule) pairs that move out. New groups smaller than min_bytes stay
+    inline: a request per page costs more than the few bytes it saves.
+    Rules whose move would flip the cascade stay inline on that page; rules
+    of linked sheets that regrouping would flip take no new pages, so their
+    sheets keep their layout. The groups are planned again until no
+    conflict is left.
+    """
+    blocked = defaultdict(set)
+    frozen = set()
+    cache = {}
+    while True:
+        groups, extracted = _group_rules(pages, min_pages, min_bytes, blocked, frozen)
+        changed = False
+        for page in pages:
+            sheet_keys = [rule.key for paths, rules in groups if page.path in paths for rule in rules]
+            linked_keys = {rule.key for rule in page.linked_rules}
+            for key in cascade_conflicts(page, extracted[page], sheet_keys, cache):
+                target = frozen if key in linked_keys else blocked[page]
+                if key not in target:
+                    target.add(key)
+                    changed = True
+        if not changed:
+            return groups, extracted
+
+
+def _group_rules(pages, min_pages, min_bytes, blocked, frozen):
+    candidates = {page: [(b, r) for b, r in page.extractable()
+                         if r.key not in blocked[page] and r.key not in frozen]
+                  for page in pages}
+
+    users = defaultdict(set)
+    first = {}
+    linked_rules = {}
+    for page in pages:
+        for rule in page.linked_rules:
+            users[rule.key].add(page.path)
+            linked_rules.setdefault(rule.key, rule)
+    linked = {key: set(paths) for key, paths in users.items()}
+    for key in _merged_order([[rule.key for rule in page.linked_rules] for page in pages]):
+        first[key] = linked_rules[key]
+    for page in pages:
+        for _, rule in candidates[page]:
+            users[rule.key].add(page.path)
+            first.setdefault(rule.key, rule)
+
+    # Rules already in a sheet stay there; inline copies only move if enough pages share them
+    owners = {}
+    for key, paths in users.items():
+        owners[key] = paths if len(paths) >= min_pages else linked.get(key, set())
+
+    grouped = {}
+    for key, rule in first.items():
+        if owners[key]:
+            grouped.setdefault(frozenset(owners[key]), []).append(rule)
+    for paths, rules in list(grouped.items()):
+        if (len(format_rules(rules).encode('utf-8')) < min_bytes
+                and not any(rule.key in linked for rule in rules)):
+            del grouped[paths]
+            for rule in rules:
+                owners[rule.key] = set()
+
+    extracted = {}
+    for page in pages:
+        extracted[page] = [(b, r) for b, r in candidates[page] if page.path in owners[r.key]]
+
+    return [(paths, rules) for paths, rules in grouped.items()], extracted
+
+
+def rewrite_page(page, extracted, sheet_paths):
+    """New page HTML with extracted rules removed and its shared sheets linked"""
+    html = page.html
+    existing = list(SHARED_LINK_RE.finditer(html))
+
+    if not extracted and not existing:
+        return html
+
+    # Whole @media blocks go if every rule inside them is extracted
+    group_rules = defaultdict(list)
+    for _, rule in page.rules:
+        if rule.group != -1:
+            group_rules[rule.group].append(rule)
+    extracted_ids = {id(rule) for _, rule in extracted}
+
+    spans = []
+    for group_index, rules in group_rules.items():
+        if all(id(r) in extracted_ids for r in rules):
+            group = page.groups[group_index]
+            spans.append(_line_span(html, group.start, group.end))
+            extracted_ids -= {id(r) for r in rules}
+    for _, rule in extracted:
+        if id(rule) in extracted_ids:
+            spans.append(_line_span(html, rule.start, rule.end))
+
+    edits = [(s, e, '') for s, e in spans]
+    anchor = existing[0].start() if existing else page.blocks[extracted[0][0]].tag_start
+    line_start = html.rfind('\n', 0, anchor) + 1
+    indent = html[line_start:anchor] if not html[line_start:anchor].strip() else ''
+    links = [f'<link rel="stylesheet" href="{os.path.relpath(p, page.dir).replace(os.sep, "/")}">'
+             for p in sheet_paths]
+    if existing and links:
+        edits.append((existing[0].start(), existing[0].end(), f'\n{indent}'.join(links)))
+        existing = existing[1:]
+    elif links:
+        edits.append((anchor, anchor, ''.join(f'{link}\n{indent}' for link in links)))
+    edits.extend(_line_span(html, m.start(), m.end()) + ('',) for m in existing)
+
+    out = []
+    pos = 0
+    for start, end, text in sorted(edits):
+        if start < pos:
+            continue  # nested span already removed with its group
+        out.append(html[pos:start])
+        out.append(text)
+        pos = end
+    out.append(html[pos:])
+    return ''.join(out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move CSS rules shared between pages into external stylesheets")
+    parser.add_argument('--root', default=REPO_ROOT, help="root directory (default: repository root)")
+    parser.add_argument('--min-pages', type=int, default=2,
+                        help="extract a rule if it occurs in at least this many pages of a directory (default: 2)")
+    parser.add_argument('--min-sheet-bytes', type=int, default=1024,
+                        help="keep a group of shared rules inline if its sheet would be smaller (default: 1024)")
+    parser.add_argument('--write', action='store_true', help="write stylesheets and rewrite pages")
+    parser.add_argument('--no-backup', action='store_true', help="do not snapshot files before --write changes them")
+    parser.add_argument('patterns', nargs='*', help=f"globs relative to --root (default: {' '.join(BATCH_PATTERNS)})")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    backup_run = BackupStore(root).start_run('extract_css') if args.write and not args.no_backup else None
+    pages = [Page(p) for p in collect_batch_files(root, args.patterns or BATCH_PATTERNS)]
+
+    by_dir = defaultdict(list)
+    for page in pages:
+        by_dir[page.dir].append(page)
+
+    print(f"🎨 Extracting shared CSS from {len(pages)} pages" + ("" if args.write else " (dry run)"))
+    print("=" * 72)
+
+    total_before = total_after = 0
+    for directory in sorted(by_dir):
+        dir_pages = by_dir[directory]
+        groups, extracted = plan_directory(dir_pages, args.min_pages, args.min_sheet_bytes)
+        if not groups and not any(page.linked_sheets for page in dir_pages):
+            continue
+
+        print(f"\n📁 {os.path.relpath(directory, root) or '.'}: "
+              f"{sum(len(rules) for _, rules in groups)} shared rules in {len(groups)} sheets")
+        sheets = {}
+        page_sheets = defaultdict(list)
+        for paths, rules in groups:
+            sheet_css = rebase_urls(format_rules(rules), directory, os.path.join(directory, SHEET_DIR))
+            digest = hashlib.sha256(sheet_css.encode('utf-8')).hexdigest()[:10]
+            sheet_path = os.path.join(directory, SHEET_DIR, f"{SHEET_PREFIX}{digest}.css")
+            sheets[sheet_path] = sheet_css
+            for path in paths:
+                page_sheets[path].append(sheet_path)
+            print(f"  → {os.path.relpath(sheet_path, root)}: {len(rules)} rules, "
+                  f"{len(sheet_css.encode('utf-8')) / 1024:.1f} KB, {len(paths)} pages")
+
+        new_html = {}
+        for page in dir_pages:
+            new_html[page] = rewrite_page(page, extracted[page], page_sheets[page.path])
+            before = len(page.html.encode('utf-8'))
+            after = len(new_html[page].encode('utf-8'))
+            total_before += before
+            total_after += after
+            if before != after:
+                print(f"  {os.path.relpath(page.path, root):<45} {before / 1024:>8.1f} KB → {after / 1024:>8.1f} KB "
+                      f"(-{(before - after) / 1024:.1f} KB, {len(extracted[page])} rules)")
+
+        if args.write:
+            for sheet_path, sheet_css in sheets.items():
+                os.makedirs(os.path.dirname(sheet_path), exist_ok=True)
+                if backup_run and not os.path.exists(sheet_path):
+                    backup_run.created(sheet_path)
+                atomic_write_parts(sheet_path, [sheet_css.encode('utf-8')])
+            for page, html in new_html.items():
+                if html != page.html:
+                    if backup_run:
+                        backup_run.snapshot(page.path)
+                    atomic_write_parts(page.path, [html.encode('utf-8')])
+            for old in glob.glob(os.path.join(directory, SHEET_DIR, f"{SHEET_PREFIX}*.css")):
+                if old not in sheets:
+                    if backup_run:
+                        backup_run.snapshot(old)
+                    os.unlink(old)
+
+    print("\n" + "=" * 72)
+    print(f"📊 Inline HTML: {total_before / 1024:.1f} KB → {total_after / 1024:.1f} KB "
+          f"(-{(total_before - total_after) / 1024:.1f} KB)")
+    if backup_run is not None and backup_run.save():
+        print(f"💾 Backup: run {backup_run.id} ({len(backup_run.files)} files)"
+              f" - restore with: python3 scripts/backup_store.py restore {backup_run.id}")
+    if not args.write:
+        print("ℹ️  Dry run - use --write to apply")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
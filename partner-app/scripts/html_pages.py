@@ -0,0 +1,21 @@
+"""
+Page selection shared by the CSS scripts (insert_mobile_css.py --batch,
+extract_css.py): glob patterns relative to a root and their expansion.
+"""
+
+import glob
+import os
+
+# Globs for --batch, relative to --root
+BATCH_PATTERNS = [
+    "*.html",
+    "partner-app/*.html"
+]
+
+
+def collect_batch_files(root, patterns):
+    """Expand the batch globs below root into a sorted, de-duplicated file list"""
+    files = set()
+    for pattern in patterns:
+        files.update(p for p in glob.glob(os.path.join(root, pattern)) if os.path.isfile(p))
+    return sorted(files)
@@ -1,9 +1,68 @@
 #!/usr/bin/env python3
+"""
+Insert the minimalistic mobile CSS block into HTML pages.
+
+Default: the five partner-app service forms (legacy behaviour).
+Batch:   python3 insert_mobile_css.py --batch [--root DIR] [--jobs N] [PATTERN ...]
+         Globs all root pages plus partner-app/*.html and processes them in a
+         process pool. Files that already carry the block are skipped without
+         being rewritten.
+
+Both modes consult the shared codemod manifest (scripts/codemod_manifest.py,
+stored as .codemod-manifest.json in --root): files that are unchanged since
+this block was last applied are skipped after a single stat() call.
+Use --force to ignore it, --no-manifest to neither read nor write it.
+
+--prune     inject only the rules whose selectors can match the page (its
+            markup, inline scripts and local scripts) and that the page does
+            not already contain; pages with nothing left are not touched.
+            The pruned block has its own marker, keyed by its rule set; a
+            re-run replaces it when the page's names have changed.
+--dead-css  report inline rules that cannot match anything in their page
+            (no files are written).
+
+Every page is snapshotted into the shared backup store
+(scripts/backup_store.py, .codemod-backups/ in --root) right before it is
+rewritten; undo a run with: python3 scripts/backup_store.py restore latest
+Use --no-backup to skip the snapshots.
 
+--critical  instead of appending the block, split each page's inline <head>
+            CSS: rules for above-the-fold content (header, first
+            .wizard-step, incl. the 768px/480px mobile rules) stay inline,
+            the full block moves to css/deferred/ and is loaded after first
+            paint (css_critical.py). Prints a before/after byte report.
+            Default pages: kanban, annahme, partner-app/meine-anfragen.
+            Run it last: split pages are skipped by the normal injection.
+
+--profile [PREFIX]  write cProfile stats and phase timings (read, scan,
+            transform, write) to PREFIX.prof / PREFIX.json (default
+            codemod-profile). Batch mode then runs serially unless --jobs is
+            given, so the profile covers the actual work.
+"""
+
+import argparse
+import hashlib
 import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARTNER_APP_DIR = os.path.dirname(SCRIPT_DIR)
+REPO_ROOT = os.path.dirname(PARTNER_APP_DIR)
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'scripts'))
 
-PARTNER_APP_DIR = "/Users/marcelgaertner/Desktop/Chrisstopher Gàrtner /Marketing/06_Digitale_Tools/Fahrzeugannahme_App/partner-app"
+from backup_store import BackupStore
+from codemod_manifest import Manifest, fingerprint
+from codemod_profile import DEFAULT_PREFIX, PhaseTimer, Profile
+from css_critical import DEFERRED_MARK_BYTES_RE, DEFERRED_MARK_RE, split_critical, stale_sheets
+from css_inject import atomic_write_parts, file_search, inject_before_last_style_close
+from css_rules import find_style_blocks, format_rules, parse_rules
+from css_usage import collect_names, dead_rules, prune_rules
+from html_pages import BATCH_PATTERNS, collect_batch_files
 
 FILES = [
     "reifen-anfrage.html",
@@ -13,6 +72,13 @@ FILES = [
     "versicherung-anfrage.html"
 ]
 
+# Pages for --critical without --batch, relative to --root (slowest first paint on the tablets)
+CRITICAL_PAGES = [
+    "kanban.html",
+    "annahme.html",
+    "partner-app/meine-anfragen.html"
+]
+
 MOBILE_CSS = """
         /* Enhanced Mobile Optimizations - Minimalistic */
         @media (max-width: 768px) {
@@ -51,44 +117,413 @@ MOBILE_CSS = """
         }
 """
 
-def insert_css_before_last_style_close(file_path):
-    """Insert CSS before the last </style> tag in the file"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+# Marker written in front of the block, keyed by its content hash. A page that
+# carries the marker (or the raw block from older runs) is left untouched.
+MOBILE_CSS_HASH = hashlib.sha256(MOBILE_CSS.encode('utf-8')).hexdigest()[:12]
+MOBILE_CSS_MARKER = f"/* mobile-css:{MOBILE_CSS_HASH} */"
+MOBILE_CSS_BLOCK = ('\n        ' + MOBILE_CSS_MARKER + MOBILE_CSS + '\n    ').encode('utf-8')
+MOBILE_CSS_NEEDLES = (MOBILE_CSS_MARKER.encode('utf-8'), MOBILE_CSS.strip().encode('utf-8'))
 
-    # Find the last occurrence of </style>
-    # We'll insert our CSS right before it
-    last_style_close = content.rfind('</style>')
+# --prune writes its own block between these markers, keyed by the hash of
+# the pruned rule set. A re-run recomputes the rules for the page's current
+# names and replaces the block when the set changed.
+PRUNED_MARKER = "/* mobile-css-pruned:{digest} */"
+PRUNED_END = "/* /mobile-css-pruned */"
+PRUNED_BLOCK_RE = re.compile(r'\n[ \t]*/\* mobile-css-pruned:([0-9a-f]+) \*/.*?/\* /mobile-css-pruned \*/\n[ \t]*',
+                             re.DOTALL)
 
-    if last_style_close == -1:
-        print(f"  ⚠️  No </style> tag found in {file_path}")
-        return False
+# Transform names in the codemod manifest
+MOBILE_CSS_TRANSFORM = f"mobile-css:{MOBILE_CSS_HASH}"
+MOBILE_CSS_PRUNED_TRANSFORM = f"mobile-css-pruned:{MOBILE_CSS_HASH}"
+CRITICAL_CSS_TRANSFORM = "critical-css:v1"
+MANIFEST_NAME = ".codemod-manifest.json"
 
-    # Insert the mobile CSS before the last </style>
-    new_content = content[:last_style_close] + MOBILE_CSS + '\n    ' + content[last_style_close:]
 
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(new_content)
+def pruned_mobile_css_block(html, page_dir):
+    """MOBILE_CSS reduced to the rules that can match the page, or None if none can.
 
-    return True
+    html must not contain an earlier pruned block (its rules would count as
+    already present).
+    """
+    names = collect_names(html, page_dir)
+    existing = {rule.key
+                for block in find_style_blocks(html)
+                for rule in parse_rules(html, block.start, block.end)[0]}
 
-def main():
-    os.chdir(PARTNER_APP_DIR)
+    rules = prune_rules(parse_rules(MOBILE_CSS)[0], names, existing)
+    if not rules:
+        return None
 
-    print("🔧 Inserting enhanced mobile CSS into 5 service form files...")
-    print("=" * 60)
+    css = format_rules(rules)
+    digest = hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]
+    lines = ''.join('        ' + line + '\n' for line in css.splitlines())
+    return ('\n        ' + PRUNED_MARKER.format(digest=digest)
+            + '\n        /* Enhanced Mobile Optimizations - Minimalistic (pruned) */\n'
+            + lines + '        ' + PRUNED_END + '\n    ')
+
+
+def insert_css_before_last_style_close(file_path, prune=False, before_write=None, timer=None):
+    """Insert CSS before the </style> of the page's last real <style> block.
+
+    before_write(file_path, view) is called with the original content right
+    before the page is replaced. timer: optional PhaseTimer.
+
+    Returns 'updated', 'skipped' (block already present), 'unused' (prune:
+    no rule can match the page), 'split' (see below) or 'no-style'.
 
+    Pages split by --critical are left alone: their full inline CSS now loads
+    from the deferred sheet, after every inline <style> in the head, so an
+    injected block would lose the cascade it is meant to win.
+    """
+    if file_search(file_path, DEFERRED_MARK_BYTES_RE):
+        return 'split'
+
+    if prune:
+        return _prune_inject(file_path, before_write, timer or (lambda name: nullcontext()))
+
+    # Insert the mobile CSS at the end of the last <style> block (mmap scan, atomic rewrite)
+    return inject_before_last_style_close(file_path, MOBILE_CSS_BLOCK, skip_if_contains=MOBILE_CSS_NEEDLES,
+                                          before_write=before_write, timer=timer)
+
+
+def _prune_inject(file_path, before_write, phase):
+    """--prune: add, replace or drop the page's pruned block"""
+    with phase('read'):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        html = data.decode('utf-8')
+    with phase('scan'):
+        # Only real <style> blocks count, not CSS in <script> templates
+        blocks = find_style_blocks(html)
+        full = any(html.find(needle.decode('utf-8'), b.start, b.end) != -1
+                   for b in blocks for needle in MOBILE_CSS_NEEDLES)
+        old = next((m for m in PRUNED_BLOCK_RE.finditer(html)
+                    if any(b.start <= m.start() and m.end() <= b.end for b in blocks)), None)
+    if not blocks:
+        return 'no-style'
+    if full:
+        return 'skipped'
+
+    with phase('transform'):
+        base = html[:old.start()] + html[old.end():] if old else html
+        block = pruned_mobile_css_block(base, os.path.dirname(file_path))
+        if old is None and block is None:
+            return 'unused'
+        if old is not None and block is not None and PRUNED_BLOCK_RE.fullmatch(block).group(1) == old.group(1):
+            return 'skipped'
+        if old is not None:
+            new_html = html[:old.start()] + (block or '') + html[old.end():]
+        else:
+            offset = blocks[-1].end
+            new_html = html[:offset] + block + html[offset:]
+
+    with phase('write'):
+        if before_write is not None:
+            before_write(file_path, data)
+        atomic_write_parts(file_path, [new_html.encode('utf-8')])
+    return 'updated'
+
+
+def inline_critical_css(file_path, before_write=None, on_create=None, timer=None):
+    """Split the page's inline head CSS into critical (inline) and deferred CSS.
+
+    before_write(path, data) is called with the old content of the page and
+    of each stale sheet before it is replaced or deleted; on_create(path)
+    before a deferred sheet that did not exist yet is written.
+
+    Returns (status, sizes): status 'updated', 'skipped' (already split),
+    'no-style' or 'all-critical' (nothing to defer); sizes holds the byte
+    counts for the report (None unless updated).
+    """
+    phase = timer or (lambda name: nullcontext())
+    with phase('read'):
+        with open(file_path, 'rb') as f:
+            data = f.read()
+        html = data.decode('utf-8')
+
+    with phase('scan'):
+        if DEFERRED_MARK_RE.search(html):
+            return 'skipped', None
+    with phase('transform'):
+        split = split_critical(html, file_path)
+    if split is None:
+        return 'no-style', None
+    if split.blocking_after >= split.blocking_before:
+        return 'all-critical', None
+
+    with phase('write'):
+        for sheet_path, css in split.sheets:
+            os.makedirs(os.path.dirname(sheet_path), exist_ok=True)
+            if on_create is not None and not os.path.exists(sheet_path):
+                on_create(sheet_path)
+            atomic_write_parts(sheet_path, [css.encode('utf-8')])
+        for old in stale_sheets(file_path, [p for p, _ in split.sheets]):
+            if before_write is not None:
+                with open(old, 'rb') as f:
+                    before_write(old, f.read())
+            os.unlink(old)
+        if before_write is not None:
+            before_write(file_path, data)
+        new_data = split.html.encode('utf-8')
+        atomic_write_parts(file_path, [new_data])
+
+    return 'updated', {
+        'page_before': len(data),
+        'page_after': len(new_data),
+        'blocking_before': split.blocking_before,
+        'blocking_after': split.blocking_after,
+        'deferred': sum(len(css.encode('utf-8')) for _, css in split.sheets),
+        'fold': split.fold
+    }
+
+
+def legacy_files():
+    """The five service forms, warning about missing ones"""
+    files = []
     for filename in FILES:
-        if os.path.exists(filename):
-            print(f"Processing {filename}...")
-            if insert_css_before_last_style_close(filename):
-                print(f"  ✓ Successfully updated {filename}")
-            else:
-                print(f"  ✗ Failed to update {filename}")
+        file_path = os.path.join(PARTNER_APP_DIR, filename)
+        if os.path.exists(file_path):
+            files.append(file_path)
         else:
             print(f"  ⚠️  File not found: {filename}")
+    return files
+
+
+def pool_map(fn, items, jobs):
+    """map() over items, in a process pool unless jobs == 1"""
+    if jobs == 1:
+        yield from map(fn, items)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(fn, items, chunksize=4)
+
+
+def process_file(file_path, prune=False, backup=None, timed=False, critical=False):
+    """Worker entry point for the process pool.
+
+    backup: (root, store path) of the backup store, or None. The snapshot
+    entries (including files created by --critical) are returned so the
+    parent can add them to the run manifest.
+    timed: also return the phase timings of this file (else None).
+    critical: run inline_critical_css() instead of the injection; its byte
+    counts are returned as the last element (else None).
+    """
+    snapshots = []
+    timer = PhaseTimer() if timed else None
+
+    def before_write(path, view):
+        store = BackupStore(*backup)
+        snapshots.append(store.snapshot(path, view))
+
+    def on_create(path):
+        snapshots.append(BackupStore(*backup).created(path))
+
+    sizes = None
+    try:
+        if critical:
+            status, sizes = inline_critical_css(
+                file_path, before_write=before_write if backup else None,
+                on_create=on_create if backup else None, timer=timer)
+        else:
+            status = insert_css_before_last_style_close(
+                file_path, prune=prune, before_write=before_write if backup else None, timer=timer)
+        if timer is None:
+            fp = fingerprint(file_path)
+        else:
+            with timer('fingerprint'):
+                fp = fingerprint(file_path)
+        return file_path, status, fp, snapshots, timer and timer.as_dict(), sizes
+    except (OSError, ValueError) as e:
+        return file_path, f'error: {e}', None, snapshots, timer and timer.as_dict(), sizes
+
+
+def report(file_path, status, root):
+    name = os.path.relpath(file_path, root)
+    if status == 'updated':
+        print(f"  ✓ Successfully updated {name}")
+    elif status in ('skipped', 'cached'):
+        print(f"  ↷ Already up to date: {name}")
+    elif status == 'unused':
+        print(f"  ↷ No matching rules for {name}")
+    elif status == 'split':
+        print(f"  ↷ Inline CSS split by --critical, restore the page to inject: {name}")
+    elif status == 'all-critical':
+        print(f"  ↷ All inline CSS is above the fold: {name}")
+    elif status == 'no-style':
+        print(f"  ⚠️  No </style> tag found in {name}")
+    else:
+        print(f"  ✗ Failed to update {name} ({status})")
+
+
+def report_critical(rows, root):
+    """Per-page before/after bytes of a --critical run"""
+    print(f"\n📐 Critical CSS: {'page':<36} {'HTML before → after':>22} {'blocking CSS before → after':>30} {'deferred':>9}")
+    for file_path, sizes in rows:
+        print(f"   {os.path.relpath(file_path, root):<48} "
+              f"{sizes['page_before'] / 1024:>8.1f} → {sizes['page_after'] / 1024:>6.1f} KB "
+              f"{sizes['blocking_before'] / 1024:>14.1f} → {sizes['blocking_after'] / 1024:>6.1f} KB "
+              f"{sizes['deferred'] / 1024:>6.1f} KB  (fold: {sizes['fold']})")
+    if len(rows) > 1:
+        before = sum(s['blocking_before'] for _, s in rows)
+        after = sum(s['blocking_after'] for _, s in rows)
+        print(f"   Render-blocking inline CSS: {before / 1024:.1f} KB → {after / 1024:.1f} KB "
+              f"(-{(before - after) / 1024:.1f} KB)")
+
+
+def run(files, root, jobs, manifest=None, force=False, prune=False, backup_run=None, profile=None,
+        critical=False):
+    """Process files (serially if jobs == 1, else in a process pool).
+
+    profile: optional Profile; counts the processed files and collects the
+    phase timings of all workers.
+    critical: split inline CSS into critical/deferred instead of injecting.
+    """
+    transform = (CRITICAL_CSS_TRANSFORM if critical
+                 else MOBILE_CSS_PRUNED_TRANSFORM if prune else MOBILE_CSS_TRANSFORM)
+    counts = {}
+    pending = []
+    for file_path in files:
+        # is_current() runs even with --force so stale manifest entries get invalidated
+        if manifest is not None and manifest.is_current(file_path, transform) and not force:
+            counts['cached'] = counts.get('cached', 0) + 1
+        else:
+            pending.append(file_path)
+
+    if profile is not None:
+        for file_path in pending:
+            profile.count(file_path)
+
+    backup = (backup_run.store.root, backup_run.store.path) if backup_run else None
+    worker = partial(process_file, prune=prune, backup=backup, timed=profile is not None, critical=critical)
+    sizes_rows = []
+    try:
+        for file_path, status, fp, snapshots, phases, sizes in pool_map(worker, pending, jobs):
+            if sizes is not None:
+                sizes_rows.append((file_path, sizes))
+            if profile is not None:
+                profile.timer.merge(phases)
+            for entry in snapshots:
+                backup_run.add(entry)
+            report(file_path, status, root)
+            key = status if fp is not None else 'error'
+            counts[key] = counts.get(key, 0) + 1
+            if manifest is not None and fp is not None:
+                manifest.record(file_path, transform, status, fp)
+    finally:
+        if manifest is not None:
+            manifest.save()
+        if backup_run is not None and backup_run.save():
+            print(f"\n💾 Backup: run {backup_run.id} ({len(backup_run.files)} files)"
+                  f" - restore with: python3 scripts/backup_store.py restore {backup_run.id}")
+
+    if sizes_rows:
+        report_critical(sizes_rows, root)
+    print("\n📊 Summary: " + ", ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    return counts.get('error', 0) == 0
+
+
+def analyze_dead_css(file_path):
+    """Worker: (file, number of dead inline rules, their bytes, first selectors)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        html = f.read()
+    dead = dead_rules(html, find_style_blocks(html), collect_names(html, os.path.dirname(file_path)))
+    size = sum(len(html[r.start:r.end].encode('utf-8')) for r in dead)
+    return file_path, len(dead), size, [r.selector for r in dead[:5]]
+
+
+def run_dead_css(files, root, jobs):
+    print(f"🔍 Dead inline CSS in {len(files)} files...")
+    print("=" * 60)
+
+    total_rules = total_bytes = 0
+    for file_path, count, size, sample in pool_map(analyze_dead_css, files, jobs):
+        if not count:
+            continue
+        total_rules += count
+        total_bytes += size
+        print(f"  {os.path.relpath(file_path, root):<45} {count:>4} rules {size / 1024:>7.1f} KB")
+        print(f"      e.g. {', '.join(sample)}")
+
+    print(f"\n📊 Summary: {total_rules} dead rules, {total_bytes / 1024:.1f} KB")
+    return True
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Insert the mobile CSS block into HTML pages")
+    parser.add_argument('--batch', action='store_true',
+                        help="process every page matched by the batch globs instead of the 5 service forms")
+    parser.add_argument('--root', default=REPO_ROOT,
+                        help="root directory for --batch globs (default: repository root)")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="worker processes for --batch (default: CPU count)")
+    parser.add_argument('patterns', nargs='*', default=None,
+                        help=f"globs relative to --root (default: {' '.join(BATCH_PATTERNS)})")
+    parser.add_argument('--manifest', default=None,
+                        help=f"codemod manifest path (default: {MANIFEST_NAME} in --root)")
+    parser.add_argument('--no-manifest', action='store_true',
+                        help="do not read or write the codemod manifest")
+    parser.add_argument('--force', action='store_true',
+                        help="re-check every file even if the manifest says it is up to date")
+    parser.add_argument('--prune', action='store_true',
+                        help="inject only rules whose selectors can match the page")
+    parser.add_argument('--dead-css', action='store_true',
+                        help="report inline rules that match nothing in their page; writes nothing")
+    parser.add_argument('--critical', action='store_true',
+                        help="inline above-the-fold CSS and defer the rest (default pages: "
+                             + ", ".join(CRITICAL_PAGES) + ")")
+    parser.add_argument('--no-backup', action='store_true',
+                        help="do not snapshot pages into the backup store before rewriting them")
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PREFIX, default=None, metavar='PREFIX',
+                        help=f"write cProfile stats and phase timings to PREFIX.prof/.json (default: {DEFAULT_PREFIX})")
+    args = parser.parse_args(argv)
+    if args.critical and (args.prune or args.dead_css):
+        parser.error("--critical cannot be combined with --prune or --dead-css")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    root = os.path.abspath(args.root)
+
+    manifest = None
+    if not args.no_manifest:
+        manifest = Manifest(args.manifest or os.path.join(root, MANIFEST_NAME), root=root)
+
+    if args.batch:
+        files = collect_batch_files(root, args.patterns or BATCH_PATTERNS)
+        report_root, jobs = root, args.jobs
+        if args.profile and jobs is None:
+            # cProfile only sees this process
+            jobs = 1
+    elif args.critical:
+        files = [p for p in (os.path.join(root, name) for name in CRITICAL_PAGES) if os.path.exists(p)]
+        report_root, jobs = root, 1
+    else:
+        files = legacy_files()
+        report_root, jobs = PARTNER_APP_DIR, 1
+
+    if args.dead_css:
+        run_dead_css(files, report_root, jobs)
+        return 0
+
+    if args.critical:
+        print(f"🔧 Splitting inline CSS into critical and deferred CSS for {len(files)} files...")
+    elif args.batch:
+        print(f"🔧 Inserting enhanced mobile CSS into {len(files)} files (batch, {jobs or os.cpu_count()} workers)...")
+    else:
+        print(f"🔧 Inserting enhanced mobile CSS into {len(files)} service form files...")
+    print("=" * 60)
+
+    backup_run = None if args.no_backup else BackupStore(root).start_run('insert_mobile_css')
+    if args.profile:
+        with Profile('insert_mobile_css', args.profile) as profile:
+            ok = run(files, report_root, jobs, manifest, args.force, args.prune, backup_run, profile,
+                     critical=args.critical)
+    else:
+        ok = run(files, report_root, jobs, manifest, args.force, args.prune, backup_run, critical=args.critical)
 
-    print("\n✅ Mobile CSS insertion complete!")
+    print("\n✅ Critical CSS split complete!" if args.critical else "\n✅ Mobile CSS insertion complete!")
+    return 0 if ok else 1
 
 if __name__ == '__main__':
-    main()
+    raise SystemExit(main())
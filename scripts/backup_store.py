@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Content-addressed backup store for codemod runs.
+
+Instead of full-copy backups next to the page (*.phase22_backup,
+*_MINIMOBILE_*.html, *.BACKUP_*), codemods snapshot each file into
+.codemod-backups/ before rewriting it:
+
+    objects/ab/cdef...   zlib-compressed blob, named by SHA-256 of the content
+    runs/<run-id>.json   per-run manifest: path, hash, size and mode per file
+
+Files a run creates are recorded with sha256 null; restoring the run
+deletes them again.
+
+Identical content is stored once, no matter how many runs or files refer
+to it, so repeated bulk runs cost only the changed blobs.
+
+Usage:
+    python3 scripts/backup_store.py list
+    python3 scripts/backup_store.py show <run-id|latest>
+    python3 scripts/backup_store.py restore <run-id|latest> [--dry-run] [FILE ...]
+    python3 scripts/backup_store.py import [--remove] FILE ...   # adopt legacy backup copies
+    python3 scripts/backup_store.py gc                            # drop unreferenced blobs
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import zlib
+
+from codemod_manifest import atomic_write_json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_NAME = ".codemod-backups"
+
+
+class BackupStore:
+    """Blob store plus run manifests below <root>/.codemod-backups"""
+
+    def __init__(self, root=REPO_ROOT, path=None):
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(self.root, STORE_NAME)
+        self.objects = os.path.join(self.path, 'objects')
+        self.runs = os.path.join(self.path, 'runs')
+
+    def key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.root).replace(os.sep, '/')
+
+    def object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def put(self, data):
+        """Store bytes (or any buffer) once; returns the SHA-256 hex digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.object_path(digest)
+        if os.path.exists(target):
+            return digest
+
+        # Workers may race on the same blob: temp file + rename keeps it whole
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.blob.', dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(zlib.compress(data, 6))
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    def get(self, digest):
+        with open(self.object_path(digest), 'rb') as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"corrupt backup blob {digest}")
+        return data
+
+    def snapshot(self, file_path, data=None):
+        """Store a file's current content; returns its run-manifest entry.
+
+        data: the file content if the caller already has it (e.g. an mmap view).
+        """
+        st = os.stat(file_path)
+        if data is None:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        return {'path': self.key(file_path), 'sha256': self.put(data),
+                'size': st.st_size, 'mode': st.st_mode & 0o7777}
+
+    def created(self, file_path):
+        """Run-manifest entry for a file that did not exist before the run"""
+        return {'path': self.key(file_path), 'sha256': None, 'size': 0, 'mode': None}
+
+    def start_run(self, tool):
+        return BackupRun(self, tool)
+
+    def list_runs(self):
+        """Run ids, oldest first (by the manifest's creation time, not the id)"""
+        if not os.path.isdir(self.runs):
+            return []
+        runs = []
+        for name in os.listdir(self.runs):
+            if name.endswith('.json'):
+                run = self.load_run(name[:-len('.json')])
+                runs.append((run['created'], run['id']))
+        return [run_id for _, run_id in sorted(runs)]
+
+    def load_run(self, run_id):
+        if run_id == 'latest':
+            runs = self.list_runs()
+            if not runs:
+                raise FileNotFoundError("no backup runs")
+            run_id = runs[-1]
+        with open(os.path.join(self.runs, run_id + '.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def restore(self, run_id, paths=None, dry_run=False):
+        """Write the files of a run back and delete the ones it created; returns their entries"""
+        run = self.load_run(run_id)
+        wanted = {self.key(p) for p in paths} if paths else None
+        restored = []
+        for entry in run['files']:
+            if wanted is not None and entry['path'] not in wanted:
+                continue
+            target = os.path.join(self.root, entry['path'])
+            if entry['sha256'] is None:
+                if not dry_run and os.path.exists(target):
+                    os.unlink(target)
+            elif not dry_run:
+                data = self.get(entry['sha256'])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix='.restore.', dir=os.path.dirname(target))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.chmod(tmp_path, entry['mode'])
+                os.replace(tmp_path, target)
+            restored.append(entry)
+        return restored
+
+    def gc(self):
+        """Remove blobs no run refers to; returns (blobs removed, bytes freed)"""
+        referenced = set()
+        for run_id in self.list_runs():
+            referenced.update(e['sha256'] for e in self.load_run(run_id)['files'] if e['sha256'])
+        removed = freed = 0
+        if not os.path.isdir(self.objects):
+            return removed, freed
+        for prefix in os.listdir(self.objects):
+            directory = os.path.join(self.objects, prefix)
+            for name in os.listdir(directory):
+                if name.startswith('.'):
+                    continue  # blob being written right now
+                if prefix + name not in referenced:
+                    path = os.path.join(directory, name)
+                    freed += os.path.getsize(path)
+                    os.unlink(path)
+                    removed += 1
+        return removed, freed
+
+
+class BackupRun:
+    """Collects snapshot entries of one codemod run and writes its manifest"""
+
+    def __init__(self, store, tool):
+        self.store = store
+        self.tool = tool
+        now = datetime.datetime.now()
+        self.id = f"{now:%Y%m%d-%H%M%S}-{tool}-{secrets.token_hex(2)}"
+        self.created_at = now.isoformat(timespec='microseconds')
+        self.files = []
+
+    def snapshot(self, file_path, data=None):
+        self.add(self.store.snapshot(file_path, data))
+
+    def created(self, file_path):
+        self.add(self.store.created(file_path))
+
+    def add(self, entry):
+        # Keep the oldest snapshot if a run touches a file twice (a created
+        # file stays created even if the run overwrites it later)
+        if all(e['path'] != entry['path'] for e in self.files):
+            self.files.append(entry)
+
+    def save(self):
+        """Write the run manifest (nothing if no file was snapshotted or created)"""
+        if not self.files:
+            return None
+        os.makedirs(self.store.runs, exist_ok=True)
+        atomic_write_json(os.path.join(self.store.runs, self.id + '.json'), {
+            'id': self.id,
+            'tool': self.tool,
+            'created': self.created_at,
+            'files': self.files
+        })
+        return self.id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Content-addressed backups of codemod runs")
+    parser.add_argument('--root', default=REPO_ROOT, help="root the stored paths are relative to")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="list backup runs")
+    p_show = sub.add_parser('show', help="list the files of a run")
+    p_show.add_argument('run_id')
+    p_restore = sub.add_parser('restore', help="write the files of a run back")
+    p_restore.add_argument('run_id')
+    p_restore.add_argument('files', nargs='*')
+    p_restore.add_argument('--dry-run', action='store_true')
+    p_import = sub.add_parser('import', help="store existing (backup) files as a run")
+    p_import.add_argument('files', nargs='+')
+    p_import.add_argument('--remove', action='store_true', help="delete the files once stored")
+    sub.add_parser('gc', help="remove blobs no run refers to")
+    args = parser.parse_args(argv)
+
+    store = BackupStore(args.root)
+
+    if args.command == 'list':
+        for run_id in store.list_runs():
+            run = store.load_run(run_id)
+            size = sum(e['size'] for e in run['files'])
+            print(f"{run_id:<45} {len(run['files']):>4} files {size / 1024:>9.1f} KB")
+        return 0
+
+    if args.command == 'show':
+        run = store.load_run(args.run_id)
+        print(f"💾 {run['id']} ({run['tool']}, {run['created']})")
+        for entry in run['files']:
+            print(f"  {(entry['sha256'] or 'new')[:12]:<12}  {entry['size']:>9}  {entry['path']}")
+        return 0
+
+    if args.command == 'restore':
+        restored = store.restore(args.run_id, args.files, dry_run=args.dry_run)
+        for entry in restored:
+            print(f"  {'↺' if entry['sha256'] else '✗'} {entry['path']}")
+        print(f"\n✅ {'Would restore' if args.dry_run else 'Restored'} {len(restored)} files")
+        return 0 if restored else 1
+
+    if args.command == 'import':
+        run = store.start_run('import')
+        for file_path in args.files:
+            run.snapshot(file_path)
+        run_id = run.save()
+        if args.remove:
+            for file_path in args.files:
+                os.unlink(file_path)
+        print(f"💾 Stored {len(args.files)} files as run {run_id}")
+        return 0
+
+    if args.command == 'gc':
+        removed, freed = store.gc()
+        print(f"🧹 Removed {removed} blobs ({freed / 1024:.1f} KB)")
+        return 0
+
+    return 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
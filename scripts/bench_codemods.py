@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the codemod tools on synthetic trees.
+
+Generates a tree of HTML pages (10 KB up to the size of kalkulation.html,
+~1 MB) and Playwright spec files with hundreds of hooks, then runs each
+transform on a fresh copy in a fresh interpreter and reports throughput
+(MB/s, files/s), peak memory and per-phase timings (read, scan, transform,
+write). Manifest and backups are off, so only the transforms are measured.
+
+Benchmarks:
+    inject-serial     insert_mobile_css, --jobs 1
+    inject-parallel   insert_mobile_css, process pool (CPU count)
+    inject-prune      insert_mobile_css --prune, --jobs 1
+    aftereach-auth    fix-aftereach-auth transforms (js_codemod engine)
+
+Phase times of the parallel run are summed over all workers.
+
+Usage:
+    python3 scripts/bench_codemods.py [--repeat N] [--sizes 10,100,300,1000] [--pages N]
+                                      [--specs N] [--hooks N] [--only NAME ...]
+    python3 scripts/bench_codemods.py --json bench.json                  # save results
+    python3 scripts/bench_codemods.py --baseline bench.json [--threshold 20]
+        -> exit 1 if a benchmark's MB/s dropped more than 20 % below the baseline
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from codemod_manifest import atomic_write_json
+from codemod_profile import PHASES, PhaseTimer, peak_rss_kb
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARTNER_SCRIPTS = os.path.join(REPO_ROOT, 'partner-app', 'scripts')
+TESTS_DIR = os.path.join(REPO_ROOT, 'tests')
+
+BENCHMARKS = ['inject-serial', 'inject-parallel', 'inject-prune', 'aftereach-auth']
+
+# Page sizes in KB; 1000 ~ kalkulation.html
+DEFAULT_SIZES = [10, 100, 300, 1000]
+
+SEED = 70
+
+
+# ----------------------------------------------------------------------
+# Synthetic trees
+# ----------------------------------------------------------------------
+
+def synthetic_page(rng, size_kb):
+    """HTML page of about size_kb KB: inline CSS, markup and inline script"""
+    target = size_kb * 1024
+    css, markup, script = [], [], []
+    length = 0
+    n = 0
+    while length < target:
+        cls = f"c{n % 400}"
+        rule = (f"        .{cls} .item-{n} {{ padding: {rng.randint(1, 24)}px; "
+                f"color: #{rng.randrange(0x1000000):06x}; border-radius: {rng.randint(0, 12)}px; }}\n")
+        div = (f'    <div class="card {cls}" id="field-{n}">\n'
+               f'        <label for="input-{n}">Feld {n}</label>\n'
+               f'        <input type="text" id="input-{n}" name="input_{n}" class="form-control">\n'
+               f'    </div>\n')
+        js = (f"        function update{n}(value) {{\n"
+              f"            const el = document.querySelector('#field-{n}'); // {{ in comment\n"
+              f"            el.classList.toggle('active', /^[a-z{{]+$/i.test(value));\n"
+              f"            el.innerHTML = `<span class=\"badge\">${{value}}</span>`;\n"
+              f"        }}\n")
+        css.append(rule)
+        markup.append(div)
+        script.append(js)
+        length += len(rule) + len(div) + len(js)
+        n += 1
+
+    return (
+        '<!DOCTYPE html>\n<html lang="de">\n<head>\n    <meta charset="UTF-8">\n'
+        f'    <title>Bench {size_kb} KB</title>\n    <style>\n'
+        '        body { margin: 0; font-family: sans-serif; }\n'
+        '        .header { display: flex; }\n'
+        + ''.join(css) +
+        '        @media (max-width: 768px) {\n            .card { padding: 8px; }\n        }\n'
+        '    </style>\n</head>\n<body>\n    <header class="header"><h1>Bench</h1></header>\n'
+        + ''.join(markup) +
+        '    <script>\n' + ''.join(script) + '    </script>\n</body>\n</html>\n'
+    )
+
+
+def synthetic_spec(rng, index, hooks):
+    """Spec file with about `hooks` hooks: beforeEach/afterEach pairs per describe,
+    afterEach without loginAsTestAdmin so the RUN #70 transform applies"""
+    out = [
+        "const { test, expect } = require('@playwright/test');",
+        "const { waitForFirebaseReady, loginAsTestAdmin } = require('../helpers/firebase-helper');",
+        ""
+    ]
+    for d in range(max(1, hooks // 2)):
+        out += [
+            f"test.describe('Bench {index} / Bereich {d}', () => {{",
+            "  test.beforeEach(async ({ page }) => {",
+            "    await page.goto('/annahme.html');",
+            "    await waitForFirebaseReady(page);",
+            "  });",
+            "",
+            "  test.afterEach(async ({ page }) => {",
+            "    await page.goto('/annahme.html');",
+            "    await waitForFirebaseReady(page);",
+            "    await page.evaluate(async () => {",
+            f"      const ids = ['bench-{d}', `t-${{Date.now()}}`]; // ) in comment",
+            "      for (const id of ids) await window.db.collection('fahrzeuge').doc(id).delete();",
+            "    });",
+            "  });",
+            ""
+        ]
+        for t in range(2):
+            out += [
+                f"  test('Fall {d}.{t}: Kennzeichen {rng.randrange(10000)}', async ({{ page }}) => {{",
+                "    await page.fill('#kennzeichen', 'MOS-' + String(Math.random()).slice(2, 6));",
+                "    expect(await page.textContent('.status')).toMatch(/gespeichert|\\}/);",
+                "  });",
+                ""
+            ]
+        out += ["});", ""]
+    return '\n'.join(out)
+
+
+def generate_tree(root, sizes, pages_per_size, specs, hooks):
+    rng = random.Random(SEED)
+    for size_kb in sizes:
+        for i in range(pages_per_size):
+            with open(os.path.join(root, f"page-{size_kb}kb-{i}.html"), 'w', encoding='utf-8') as f:
+                f.write(synthetic_page(rng, size_kb))
+    spec_dir = os.path.join(root, 'tests', 'integration')
+    os.makedirs(spec_dir)
+    for i in range(specs):
+        with open(os.path.join(spec_dir, f"{i:02d}-bench.spec.js"), 'w', encoding='utf-8') as f:
+            f.write(synthetic_spec(rng, i, hooks))
+
+
+def tree_files(root):
+    pages = sorted(os.path.join(root, n) for n in os.listdir(root) if n.endswith('.html'))
+    spec_dir = os.path.join(root, 'tests', 'integration')
+    specs = sorted(os.path.join(spec_dir, n) for n in os.listdir(spec_dir))
+    return pages, specs
+
+
+# ----------------------------------------------------------------------
+# Worker (runs in a fresh interpreter per benchmark run)
+# ----------------------------------------------------------------------
+
+class _Counter:
+    """What insert_mobile_css.run() expects of a profile, minus cProfile"""
+
+    def __init__(self):
+        self.timer = PhaseTimer()
+        self.files = 0
+        self.bytes = 0
+
+    def count(self, file_path):
+        self.bytes += os.path.getsize(file_path)
+        self.files += 1
+
+
+def _load_aftereach_transforms():
+    sys.path.insert(0, TESTS_DIR)
+    spec = importlib.util.spec_from_file_location('fix_aftereach_auth', os.path.join(TESTS_DIR, 'fix-aftereach-auth.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return [fn for _, fn in module.transforms]
+
+
+def worker(name, root):
+    pages, specs = tree_files(root)
+    counter = _Counter()
+
+    if name.startswith('inject'):
+        sys.path.insert(0, PARTNER_SCRIPTS)
+        from insert_mobile_css import run
+        jobs = None if name == 'inject-parallel' else 1
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(pages, root, jobs, prune=name == 'inject-prune', profile=counter)
+        wall = time.perf_counter() - start
+    else:
+        transforms = _load_aftereach_transforms()
+        from js_codemod import run_transforms
+        start = time.perf_counter()
+        for file_path in specs:
+            counter.count(file_path)
+            run_transforms(file_path, transforms, timer=counter.timer)
+        wall = time.perf_counter() - start
+
+    print(json.dumps({
+        'wall_s': wall,
+        'files': counter.files,
+        'bytes': counter.bytes,
+        'phases': counter.timer.as_dict(),
+        'peak_rss_kb': max(peak_rss_kb(), peak_rss_kb(children=True))
+    }))
+
+
+# ----------------------------------------------------------------------
+# Driver
+# ----------------------------------------------------------------------
+
+def run_once(name, tree, workdir):
+    copy = os.path.join(workdir, 'run')
+    shutil.rmtree(copy, ignore_errors=True)
+    shutil.copytree(tree, copy)
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name, copy],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(runs):
+    best = min(runs, key=lambda r: r['wall_s'])
+    mb = best['bytes'] / (1024 * 1024)
+    return {
+        'files': best['files'],
+        'mb': mb,
+        'wall_s': best['wall_s'],
+        'mb_per_s': mb / best['wall_s'] if best['wall_s'] else None,
+        'files_per_s': best['files'] / best['wall_s'] if best['wall_s'] else None,
+        'peak_rss_kb': max(r['peak_rss_kb'] for r in runs),
+        'phases': best['phases']
+    }
+
+
+def print_table(results):
+    phase_cols = ''.join(f"{p:>11}" for p in PHASES)
+    print(f"{'benchmark':<16} {'files':>5} {'MB':>7} {'best wall':>11} {'MB/s':>8} {'files/s':>8} "
+          f"{'peak RSS':>9}{phase_cols}")
+    for name, r in results.items():
+        phases = ''.join(f"{r['phases'].get(p, {}).get('seconds', 0) * 1000:>9.1f}ms" for p in PHASES)
+        print(f"{name:<16} {r['files']:>5} {r['mb']:>7.2f} {r['wall_s'] * 1000:>9.1f}ms "
+              f"{r['mb_per_s']:>8.1f} {r['files_per_s']:>8.1f} {r['peak_rss_kb'] / 1024:>7.1f}MB{phases}")
+
+
+def compare(results, params, baseline_path, threshold):
+    """Print the throughput change against a saved run; returns the names that regressed"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    old_params = {k: v for k, v in baseline.get('params', {}).items() if k != 'repeat'}
+    if old_params != {k: v for k, v in params.items() if k != 'repeat'}:
+        print(f"\n⚠️  Baseline was measured with other parameters: {old_params}")
+
+    regressed = []
+    print(f"\n📉 Compared with {baseline_path} (threshold {threshold:.0f} %)")
+    for name, r in results.items():
+        old = baseline['results'].get(name)
+        if not old:
+            print(f"   {name:<16} (not in baseline)")
+            continue
+        change = (r['mb_per_s'] - old['mb_per_s']) / old['mb_per_s'] * 100
+        slow = change < -threshold
+        if slow:
+            regressed.append(name)
+        print(f"   {'❌' if slow else '✅'} {name:<16} {old['mb_per_s']:>8.1f} MB/s → {r['mb_per_s']:>8.1f} MB/s "
+              f"({change:+.1f} %)")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the codemod tools on synthetic trees")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated page sizes in KB (default: %(default)s)")
+    parser.add_argument('--pages', type=int, default=5, help="pages per size (default: %(default)s)")
+    parser.add_argument('--specs', type=int, default=20, help="spec files (default: %(default)s)")
+    parser.add_argument('--hooks', type=int, default=300, help="hooks per spec file (default: %(default)s)")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, help="run only these benchmarks")
+    parser.add_argument('--json', metavar='OUT', help="write the results as JSON")
+    parser.add_argument('--baseline', metavar='JSON', help="compare with the results of an earlier --json run")
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help="fail if a benchmark's MB/s drops more than this many percent below the baseline (default: %(default)s)")
+    parser.add_argument('--worker', nargs=2, metavar=('NAME', 'TREE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(*args.worker)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    names = args.only or BENCHMARKS
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        tree = os.path.join(workdir, 'tree')
+        os.makedirs(tree)
+        generate_tree(tree, sizes, args.pages, args.specs, args.hooks)
+        pages, specs = tree_files(tree)
+        page_mb = sum(os.path.getsize(p) for p in pages) / (1024 * 1024)
+        spec_mb = sum(os.path.getsize(p) for p in specs) / (1024 * 1024)
+        print(f"📏 {len(pages)} pages ({page_mb:.1f} MB, {args.sizes} KB), "
+              f"{len(specs)} specs ({spec_mb:.1f} MB, ~{args.hooks} hooks each), {args.repeat} runs each")
+        print("=" * 72)
+
+        for name in names:
+            results[name] = summarize([run_once(name, tree, workdir) for _ in range(args.repeat)])
+
+    print_table(results)
+
+    params = {'sizes': sizes, 'pages': args.pages, 'specs': args.specs, 'hooks': args.hooks,
+              'repeat': args.repeat, 'cpus': os.cpu_count()}
+    if args.json:
+        atomic_write_json(args.json, {
+            'generated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'params': params,
+            'results': results
+        })
+        print(f"\n💾 Results written to {args.json}")
+
+    if args.baseline and compare(results, params, args.baseline, args.threshold):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+"""
+Content-hash manifest shared by the codemod scripts.
+
+For every file a codemod has looked at, .codemod-manifest.json records
+size, mtime, SHA-256 and the transforms already applied to it. Before
+opening a file a script asks is_current(); when size and mtime still match
+the recorded values the file is skipped after a single stat() call. If only
+the mtime moved (touch, checkout) the hash is re-checked before anything is
+invalidated.
+
+The manifest also keeps a log of every run that actually changed a file,
+so it doubles as an audit trail of what was injected where.
+
+Used by:
+    partner-app/scripts/insert_mobile_css.py
+    tests/fix-aftereach-auth.py
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MANIFEST = os.path.join(REPO_ROOT, '.codemod-manifest.json')
+
+MANIFEST_VERSION = 1
+
+# Statuses after which the file carries the transform. Anything else
+# ('unused', 'no-style', 'split', errors) is re-checked on the next run.
+APPLIED_STATUSES = frozenset(['updated', 'skipped'])
+
+
+def sha256_file(file_path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(file_path):
+    """Size, mtime and hash of a file. Safe to call from worker processes."""
+    st = os.stat(file_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': sha256_file(file_path)}
+
+
+def _default_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def atomic_write_text(path, text):
+    """Write text via temp file + rename, keeping the mode of an existing file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o7777 if os.path.exists(path) else _default_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data, indent=2, sort_keys=False):
+    """Write JSON via temp file + rename, keeping the mode of an existing file"""
+    atomic_write_text(path, json.dumps(data, indent=indent, sort_keys=sort_keys, ensure_ascii=False) + '\n')
+
+
+class Manifest:
+    """JSON manifest of file fingerprints and applied transforms"""
+
+    def __init__(self, path=DEFAULT_MANIFEST, root=REPO_ROOT):
+        self.path = path
+        self.root = root
+        self.files = {}
+        self.log = []
+        self.dirty = False
+
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+                self.log = data.get('log', [])
+
+    def key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.root).replace(os.sep, '/')
+
+    def is_current(self, file_path, transform):
+        """True if transform was applied (updated/skipped) and the file has not changed since"""
+        entry = self.files.get(self.key(file_path))
+        if entry is None:
+            return False
+
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+
+        if st.st_size != entry['size']:
+            self._invalidate(entry)
+            return False
+
+        if st.st_mtime_ns != entry['mtime_ns']:
+            # mtime moved: only the content decides whether the entry is stale
+            if sha256_file(file_path) != entry['sha256']:
+                self._invalidate(entry)
+                return False
+            entry['mtime_ns'] = st.st_mtime_ns
+            self.dirty = True
+
+        recorded = entry['transforms'].get(transform)
+        return recorded is not None and recorded['status'] in APPLIED_STATUSES
+
+    def _invalidate(self, entry):
+        # Content changed outside the codemods: recorded transforms no longer describe it
+        if entry['transforms']:
+            entry['transforms'] = {}
+            self.dirty = True
+
+    def record(self, file_path, transform, status, fp=None):
+        """Record that transform ran on file_path with the given status.
+
+        fp: fingerprint() of the file after the transform (computed if omitted).
+        """
+        fp = fp or fingerprint(file_path)
+        key = self.key(file_path)
+        entry = self.files.setdefault(key, {'transforms': {}})
+        if entry.get('sha256') not in (None, fp['sha256']) and status != 'updated':
+            # File changed behind our back since the last record
+            entry['transforms'] = {}
+
+        entry.update(fp)
+        now = time.strftime('%Y-%m-%dT%H:%M:%S')
+        entry['transforms'][transform] = {'status': status, 'at': now}
+
+        if status == 'updated':
+            self.log.append({'file': key, 'transform': transform, 'sha256': fp['sha256'], 'at': now})
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {'version': MANIFEST_VERSION, 'files': self.files, 'log': self.log}
+        atomic_write_json(self.path, data, sort_keys=True)
+        self.dirty = False
@@ -0,0 +1,146 @@
+"""
+Opt-in timing and profiling for the codemod scripts.
+
+PhaseTimer accumulates wall time per phase. The engines take it as an
+optional timer argument and wrap their steps in timer('read'),
+timer('scan'), timer('transform') and timer('write'); without a timer they
+skip the bookkeeping entirely. Worker processes return timer.as_dict() and
+the parent merges it.
+
+Profile wraps a whole run in cProfile and writes, for --profile PREFIX:
+
+    PREFIX.prof   cProfile stats (python3 -m pstats PREFIX.prof, snakeviz, ...)
+    PREFIX.json   totals, throughput, peak memory, phase timings, top functions
+
+Used by:
+    partner-app/scripts/insert_mobile_css.py
+    tests/fix-aftereach-auth.py
+    scripts/bench_codemods.py
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+from codemod_manifest import atomic_write_json
+
+PHASES = ('read', 'scan', 'transform', 'write')
+DEFAULT_PREFIX = 'codemod-profile'
+
+
+def peak_rss_kb(children=False):
+    """Peak resident set size of this process (or of its finished children)"""
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+class PhaseTimer:
+    """Wall time and call count per phase name"""
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds, calls=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    def merge(self, data):
+        """Add the as_dict() result of another timer (e.g. from a worker)"""
+        for name, entry in (data or {}).items():
+            self.add(name, entry['seconds'], entry['calls'])
+
+    def as_dict(self):
+        names = [p for p in PHASES if p in self.seconds] + sorted(set(self.seconds) - set(PHASES))
+        return {name: {'seconds': self.seconds[name], 'calls': self.calls[name]} for name in names}
+
+    def summary(self):
+        """'read 1.2ms, scan 3.4ms, ...'"""
+        return ', '.join(f"{name} {entry['seconds'] * 1000:.1f}ms" for name, entry in self.as_dict().items())
+
+
+class Profile:
+    """cProfile plus phase timings for one codemod run"""
+
+    def __init__(self, tool, prefix=DEFAULT_PREFIX):
+        self.tool = tool
+        self.prefix = prefix
+        self.timer = PhaseTimer()
+        self.profiler = cProfile.Profile()
+        self.files = 0
+        self.bytes = 0
+        self.wall = 0.0
+
+    def start(self):
+        self._start = time.perf_counter()
+        self.profiler.enable()
+
+    def stop(self):
+        """Stop profiling and write PREFIX.prof / PREFIX.json"""
+        self.profiler.disable()
+        self.wall = time.perf_counter() - self._start
+        self.write()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def count(self, file_path):
+        """Count a file for the throughput figures (call before it is rewritten)"""
+        self.bytes += os.path.getsize(file_path)
+        self.files += 1
+
+    def top_functions(self, limit=15):
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({'function': f"{func} ({filename}:{line})", 'calls': ncalls,
+                         'tottime_s': tottime, 'cumtime_s': cumtime})
+        rows.sort(key=lambda r: r['cumtime_s'], reverse=True)
+        return rows[:limit]
+
+    def results(self):
+        mb = self.bytes / (1024 * 1024)
+        return {
+            'tool': self.tool,
+            'files': self.files,
+            'bytes': self.bytes,
+            'wall_s': self.wall,
+            'mb_per_s': mb / self.wall if self.wall else None,
+            'files_per_s': self.files / self.wall if self.wall else None,
+            'peak_rss_kb': peak_rss_kb(),
+            'peak_rss_children_kb': peak_rss_kb(children=True),
+            'phases': self.timer.as_dict(),
+            'top_functions': self.top_functions()
+        }
+
+    def write(self):
+        self.profiler.dump_stats(self.prefix + '.prof')
+        results = self.results()
+        atomic_write_json(self.prefix + '.json', results)
+
+        print(f"\n⏱️  Profile: {results['files']} files, {self.bytes / 1024:.1f} KB in {self.wall * 1000:.1f}ms"
+              + (f" ({results['mb_per_s']:.1f} MB/s, {results['files_per_s']:.1f} files/s)" if self.wall else ""))
+        if self.timer.seconds:
+            print(f"   Phases: {self.timer.summary()}")
+        print(f"   Peak RSS: {results['peak_rss_kb'] / 1024:.1f} MB")
+        print(f"   Written: {self.prefix}.prof, {self.prefix}.json")
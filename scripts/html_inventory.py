@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Incremental indexer for HTML_INVENTORY.json.
+
+Reads every root page once and extracts, in that single pass, the script
+functions, Firestore collection references (collection('...') and
+getCollection('...')), form fields (<input>/<select>/<textarea>) and linked
+CSS/JS. Pages are parsed in a process pool; per-page results are cached in
+.html-inventory-cache.json keyed by content hash, and a page whose size and
+mtime are unchanged is not even hashed. Re-indexing after a one-file edit
+therefore re-parses only that file.
+
+Hand-written fields in HTML_INVENTORY.json (purpose, importance,
+key_functions, known_issues, ...) are kept; generated data goes into each
+page's "index" object plus "lines", "title" and "functions.total". The
+top-level "collections" map lists the pages using each collection.
+
+Usage:
+    python3 scripts/html_inventory.py [--root DIR] [--jobs N] [--check] [PATTERN ...]
+    python3 scripts/html_inventory.py --collection fahrzeuge   # pages using a collection
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from codemod_manifest import atomic_write_json, sha256_file
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INVENTORY_NAME = "HTML_INVENTORY.json"
+CACHE_NAME = ".html-inventory-cache.json"
+DEFAULT_PATTERNS = ["*.html"]
+
+# Bump when the extraction changes so cached results are recomputed
+INDEX_VERSION = 1
+
+TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title\s*>', re.IGNORECASE | re.DOTALL)
+SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+SRC_RE = re.compile(r'\bsrc\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+STYLESHEET_RE = re.compile(r'<link\b[^>]*\brel\s*=\s*["\']stylesheet["\'][^>]*>', re.IGNORECASE)
+HREF_RE = re.compile(r'\bhref\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+FIELD_RE = re.compile(r'<(input|select|textarea)\b([^>]*)>', re.IGNORECASE)
+ATTR_RE = re.compile(r'\b(id|name|type)\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+FUNCTION_RE = re.compile(
+    r'(?:^|[^\w$.])(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)\s*\('
+    r'|(?:^|[^\w$.])(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^()]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)'
+    r'|\bwindow\.([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^()]*\)\s*=>)',
+    re.MULTILINE)
+COLLECTION_RE = re.compile(r'\b(?:collection|getCollection)\(\s*([\'"`])(.+?)\1')
+TEMPLATE_EXPR_RE = re.compile(r'_?\$\{[^}]*\}')
+
+
+def normalize_collection(name):
+    """'fahrzeuge_${werkstattId}' -> 'fahrzeuge' (multi-tenant suffix)"""
+    return TEMPLATE_EXPR_RE.sub('', name).strip('_/') or name
+
+
+def index_page(file_path):
+    """Extract the inventory data of one page. Runs in worker processes."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    functions = set()
+    collections = set()
+    scripts = []
+    for attrs, body in SCRIPT_RE.findall(html):
+        src = SRC_RE.search(attrs)
+        if src:
+            scripts.append(src.group(1))
+            continue
+        for m in FUNCTION_RE.finditer(body):
+            functions.add(next(g for g in m.groups() if g))
+        for _, name in COLLECTION_RE.findall(body):
+            collections.add(normalize_collection(name))
+
+    fields = []
+    for tag, attrs in FIELD_RE.findall(html):
+        values = {k.lower(): v for k, v in ATTR_RE.findall(attrs)}
+        if 'id' in values or 'name' in values:
+            fields.append({'tag': tag.lower(), **values})
+
+    stylesheets = []
+    for link in STYLESHEET_RE.findall(html):
+        href = HREF_RE.search(link)
+        if href:
+            stylesheets.append(href.group(1))
+
+    title = TITLE_RE.search(html)
+    return {
+        'title': ' '.join(title.group(1).split()) if title else '',
+        'lines': html.count('\n') + 1,
+        'functions': sorted(functions),
+        'collections': sorted(collections),
+        'form_fields': fields,
+        'stylesheets': stylesheets,
+        'scripts': scripts
+    }
+
+
+def _index_worker(item):
+    key, file_path = item
+    return key, index_page(file_path)
+
+
+class Cache:
+    """Per-page results keyed by relative path, validated by stat and SHA-256"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                self.entries = data.get('files', {})
+
+    def lookup(self, key, file_path):
+        """Cached result if the file is unchanged, else None. Also returns the fingerprint."""
+        st = os.stat(file_path)
+        fp = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        entry = self.entries.get(key)
+        if entry and entry['size'] == fp['size'] and entry['mtime_ns'] == fp['mtime_ns']:
+            return entry['result'], dict(fp, sha256=entry['sha256'])
+
+        fp['sha256'] = sha256_file(file_path)
+        if entry and entry['sha256'] == fp['sha256']:
+            return entry['result'], fp
+        return None, fp
+
+    def store(self, key, fp, result):
+        self.entries[key] = dict(fp, result=result)
+
+    def save(self, keys, root):
+        # Drop pages that no longer exist (a pattern run does not see the others)
+        self.entries = {k: v for k, v in self.entries.items()
+                        if k in keys or os.path.isfile(os.path.join(root, k))}
+        atomic_write_json(self.path, {'version': INDEX_VERSION, 'files': self.entries}, indent=None)
+
+
+def build_index(root, patterns, cache, jobs=None):
+    """{relative path: result} for all pages, re-parsing only changed ones"""
+    files = sorted({p for pattern in patterns for p in glob.glob(os.path.join(root, pattern)) if os.path.isfile(p)})
+    results = {}
+    fingerprints = {}
+    todo = []
+    for file_path in files:
+        key = os.path.relpath(file_path, root).replace(os.sep, '/')
+        result, fingerprints[key] = cache.lookup(key, file_path)
+        if result is None:
+            todo.append((key, file_path))
+        else:
+            results[key] = result
+
+    if len(todo) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            parsed = list(pool.map(_index_worker, todo))
+    else:
+        parsed = [_index_worker(item) for item in todo]
+
+    for key, result in parsed:
+        results[key] = result
+        cache.store(key, fingerprints[key], result)
+
+    return results, [key for key, _ in todo]
+
+
+def merge_inventory(inventory, results, root, patterns):
+    """Update generated fields, keep hand-written ones.
+
+    results only covers the pages matched by patterns: other entries are
+    left alone, and an entry is dropped only if it matches one of the
+    patterns but its page no longer exists.
+    """
+    files = inventory.setdefault('files', {})
+    for key in list(files):
+        if key in results:
+            continue
+        if (any(fnmatch.fnmatch(key, pattern) for pattern in patterns)
+                and not os.path.isfile(os.path.join(root, key))):
+            del files[key]
+
+    for key in sorted(results):
+        result = results[key]
+        entry = files.setdefault(key, {})
+        entry['title'] = result['title']
+        entry['lines'] = result['lines']
+        functions = entry.get('functions')
+        if not isinstance(functions, dict):
+            functions = entry['functions'] = {}
+        functions['total'] = len(result['functions'])
+        entry['index'] = {
+            'functions': result['functions'],
+            'collections': result['collections'],
+            'form_fields': result['form_fields'],
+            'stylesheets': result['stylesheets'],
+            'scripts': result['scripts']
+        }
+
+    # Totals and the collection map come from all entries, not just this run's pages
+    collection_usage = {}
+    for key in sorted(files):
+        for name in files[key].get('index', {}).get('collections', []):
+            collection_usage.setdefault(name, []).append(key)
+
+    metadata = inventory.setdefault('metadata', {})
+    metadata['generated'] = time.strftime('%Y-%m-%d')
+    metadata['generator'] = 'scripts/html_inventory.py'
+    metadata['total_root_html_files'] = len(files)
+    metadata['total_lines_analyzed'] = sum(entry.get('lines', 0) for entry in files.values())
+    inventory['collections'] = dict(sorted(collection_usage.items()))
+    return inventory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regenerate HTML_INVENTORY.json incrementally")
+    parser.add_argument('--root', default=REPO_ROOT, help="directory with the pages (default: repository root)")
+    parser.add_argument('--jobs', '-j', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--check', action='store_true',
+                        help="exit 1 if HTML_INVENTORY.json is out of date; writes nothing but the cache")
+    parser.add_argument('--collection', help="list the pages that use a Firestore collection and exit")
+    parser.add_argument('patterns', nargs='*', help=f"globs relative to --root (default: {' '.join(DEFAULT_PATTERNS)})")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    inventory_path = os.path.join(root, INVENTORY_NAME)
+    cache = Cache(os.path.join(root, CACHE_NAME))
+
+    start = time.perf_counter()
+    patterns = args.patterns or DEFAULT_PATTERNS
+    results, parsed = build_index(root, patterns, cache, args.jobs)
+    cache.save(set(results), root)
+
+    if args.collection:
+        pages = [key for key, r in sorted(results.items()) if args.collection in r['collections']]
+        print('\n'.join(pages) if pages else f"⚠️  No page uses collection '{args.collection}'")
+        return 0
+
+    inventory = {}
+    if os.path.exists(inventory_path):
+        with open(inventory_path, 'r', encoding='utf-8') as f:
+            inventory = json.load(f)
+    before = json.dumps(inventory.get('files', {}), sort_keys=True)
+    merge_inventory(inventory, results, root, patterns)
+    changed = json.dumps(inventory['files'], sort_keys=True) != before
+
+    elapsed = time.perf_counter() - start
+    print(f"📇 Indexed {len(results)} pages in {elapsed:.2f}s ({len(parsed)} parsed, {len(results) - len(parsed)} from cache)")
+
+    if args.check:
+        print("❌ HTML_INVENTORY.json is out of date" if changed else "✅ HTML_INVENTORY.json is up to date")
+        return 1 if changed else 0
+
+    if changed:
+        atomic_write_json(inventory_path, inventory)
+        print(f"✅ Updated {INVENTORY_NAME}")
+    else:
+        print(f"✅ {INVENTORY_NAME} already up to date")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
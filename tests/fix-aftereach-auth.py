@@ -5,185 +5,211 @@ RUN #70: Fix afterEach() Authentication Issue
 Problem: afterEach() cleanup läuft OHNE Authentifizierung nach page.goto()
 Lösung: Füge loginAsTestAdmin() zu afterEach() hinzu NACH waitForFirebaseReady()
 
-Dateien zum Updaten:
-- 01-vehicle-intake.spec.js
-- 02-partner-flow.spec.js
-- 03-kanban-drag-drop.spec.js (braucht auch beforeAll!)
-- 04-edge-cases.spec.js
-- 05-transaction-failure.spec.js (braucht auch beforeAll!)
-- 06-cascade-delete-race.spec.js (braucht auch beforeAll!)
-- 07-service-consistency-v32.spec.js (braucht auch beforeAll!)
-"""
+Das Login bekommt dieselbe Seite wie waitForFirebaseReady(...). Fehlt
+loginAsTestAdmin im require von ../helpers/firebase-helper, wird es dort
+ergänzt; Dateien ohne dieses require werden mit Warnung übersprungen.
 
-import os
-import re
+Der Fix läuft über die Codemod-Engine (js_codemod.py): jede Datei wird
+einmal gelesen, einmal tokenisiert und höchstens einmal geschrieben.
+Klammern in Strings, Template-Literals, Regex und Kommentaren stören nicht.
 
-# Test-Dateien zum Updaten
-test_files = [
-    '01-vehicle-intake.spec.js',
-    '02-partner-flow.spec.js',
-    '03-kanban-drag-drop.spec.js',
-    '04-edge-cases.spec.js',
-    '05-transaction-failure.spec.js',
-    '06-cascade-delete-race.spec.js',
-    '07-service-consistency-v32.spec.js'
-]
+Aufruf:
+    python3 tests/fix-aftereach-auth.py --dry-run            # Vorschau: alle Specs
+    python3 tests/fix-aftereach-auth.py DATEI ...            # nur diese Dateien ändern
+    python3 tests/fix-aftereach-auth.py --all                # alle Specs in integration/ und e2e/ ändern
 
-# Basis-Pfad
-base_path = '/Users/marcelgaertner/Desktop/Chritstopher Gàrtner /Marketing/06_Digitale_Tools/Fahrzeugannahme_App/tests'
+Ohne Dateien schreibt das Skript nur mit --all; vorher --dry-run ansehen.
 
-def add_auth_to_aftereach(file_path):
-    """Füge loginAsTestAdmin() zu afterEach() Hooks hinzu"""
+Kein beforeAll()-Login mehr: ein Login in beforeAll() läuft in einem eigenen
+Browser-Kontext, die Firebase-Auth kommt in den page-Kontexten der Tests nie
+an. Das Login in afterEach() deckt das Aufräumen ab.
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+Unveränderte Dateien, auf die der Fix schon angewendet wurde, werden über
+das Codemod-Manifest (scripts/codemod_manifest.py) per stat() übersprungen.
+--force prüft trotzdem alle Dateien, --no-manifest ignoriert das Manifest.
 
-    original_content = content
+Vor dem Schreiben landet jede Datei im Backup-Store (scripts/backup_store.py,
+.codemod-backups/); rückgängig machen mit:
+    python3 scripts/backup_store.py restore latest
+--no-backup schaltet das ab.
 
-    # Strategie: Finde alle test.afterEach Blöcke und prüfe ob loginAsTestAdmin fehlt
-    # Falls ja, füge es NACH waitForFirebaseReady ein
-
-    lines = content.split('\n')
-    result_lines = []
-    in_aftereach = False
-    aftereach_block = []
-    brace_count = 0
+--profile [PRÄFIX] schreibt cProfile-Statistik und Phasen-Zeiten (read, scan,
+transform, write) nach PRÄFIX.prof / PRÄFIX.json (Standard: codemod-profile).
+"""
 
-    for i, line in enumerate(lines):
-        if 'test.afterEach(async ({ page }) => {' in line:
-            in_aftereach = True
-            aftereach_block = [line]
-            brace_count = 1
-        elif in_aftereach:
-            aftereach_block.append(line)
+import argparse
+import glob
+import os
+import re
+import sys
 
-            # Zähle geschweifte Klammern um Ende zu finden
-            brace_count += line.count('{')
-            brace_count -= line.count('}')
+from js_codemod import run_transforms
 
-            if brace_count == 0 and '});' in line:
-                # Ende des afterEach Blocks
-                in_aftereach = False
+# Basis-Pfad (Verzeichnis dieses Skripts)
+base_path = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(base_path)
 
-                # Prüfe ob loginAsTestAdmin fehlt
-                block_text = '\n'.join(aftereach_block)
+sys.path.insert(0, os.path.join(repo_root, 'scripts'))
 
-                if 'loginAsTestAdmin' not in block_text:
-                    # Finde waitForFirebaseReady Zeile und füge danach ein
-                    modified_block = []
-                    for block_line in aftereach_block:
-                        modified_block.append(block_line)
+from backup_store import BackupStore
+from codemod_manifest import Manifest
+from codemod_profile import DEFAULT_PREFIX, Profile
 
-                        if 'await waitForFirebaseReady(page);' in block_line:
-                            # Füge Authentifizierungs-Zeile DANACH ein
-                            indent = ' ' * 4  # afterEach body hat 4 Leerzeichen Einrückung
-                            modified_block.append(f'{indent}await loginAsTestAdmin(page);')
+# Test-Dateien zum Updaten (Globs relativ zu base_path)
+test_globs = [
+    'integration/*.spec.js',
+    'e2e/*.spec.js'
+]
 
-                    result_lines.extend(modified_block)
-                else:
-                    # Hat bereits Auth, behalte wie es ist
-                    result_lines.extend(aftereach_block)
+# const { ... } = require('../helpers/firebase-helper')
+HELPER_REQUIRE_RE = re.compile(
+    r'''\{([^{}]*)\}\s*=\s*require\(\s*(['"])\.\./helpers/firebase-helper(?:\.js)?\2\s*\)''')
 
-                aftereach_block = []
-        else:
-            result_lines.append(line)
 
-    modified_content = '\n'.join(result_lines)
+def ensure_helper_import(spec, name):
+    """Sorgt dafür, dass name aus ../helpers/firebase-helper importiert wird.
 
-    # Schreibe nur zurück wenn sich was geändert hat
-    if modified_content != original_content:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(modified_content)
+    Ergänzt die require-Destrukturierung bei Bedarf; False, wenn die Datei den
+    Helfer gar nicht per Destrukturierung lädt.
+    """
+    match = HELPER_REQUIRE_RE.search(spec.source)
+    if match is None:
+        return False
+    if re.search(r'(?<![\w$])' + re.escape(name) + r'(?![\w$])', match.group(1)):
         return True
 
-    return False
-
-def add_beforeall_if_missing(file_path):
-    """Füge beforeAll() Authentifizierungs-Hook hinzu falls fehlend"""
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Prüfe ob bereits beforeAll mit loginAsTestAdmin vorhanden
-    if 'test.beforeAll' in content and 'loginAsTestAdmin' in content:
-        return False  # Hat es bereits
-
-    # Finde test.describe Block und füge beforeAll VOR erstem test.beforeEach oder test() ein
-    lines = content.split('\n')
-    result_lines = []
-    inserted = False
-
-    for i, line in enumerate(lines):
-        # Suche nach erstem test.beforeEach oder test( oder test.afterEach innerhalb test.describe
-        if not inserted and ('test.beforeEach(' in line or 'test(' in line or 'test.afterEach(' in line):
-            # Füge beforeAll VOR dieser Zeile ein
-            indent = ' ' * 2  # Innerhalb test.describe
-            result_lines.append('')
-            result_lines.append(f'{indent}// RUN #70: Login als Test-Admin VOR allen Tests (ermöglicht Firestore-Zugriff)')
-            result_lines.append(f'{indent}test.beforeAll(async ({{ page }}) => {{')
-            result_lines.append(f'{indent}  await page.goto(\'/annahme.html\');')
-            result_lines.append(f'{indent}  await waitForFirebaseReady(page);')
-            result_lines.append(f'{indent}  await loginAsTestAdmin(page);')
-            result_lines.append(f'{indent}  console.log(\'✅ RUN #70: Test-Suite als Admin authentifiziert\');')
-            result_lines.append(f'{indent}}});')
-            result_lines.append('')
-            inserted = True
-
-        result_lines.append(line)
-
-    if inserted:
-        modified_content = '\n'.join(result_lines)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(modified_content)
-        return True
+    # Als ersten Eintrag, im Stil der vorhandenen Liste (mehrzeilig oder einzeilig)
+    inner = match.group(1)
+    lead = inner[:len(inner) - len(inner.lstrip())]
+    spec.insert(match.start(1) + len(lead), f'{name},' + (lead if '\n' in lead else ' '))
+    return True
 
-    return False
 
-# Haupt-Ausführung
-print('🔧 RUN #70: Fixe afterEach() Authentifizierungs-Problem\n')
+def add_auth_to_aftereach(spec):
+    """Füge loginAsTestAdmin() zu afterEach() Hooks hinzu"""
 
-files_modified = []
-files_skipped = []
+    inserts = []
+    for block in spec.find('afterEach'):
+        # Hat bereits Auth, behalte wie es ist
+        if spec.calls(block, 'loginAsTestAdmin'):
+            continue
+
+        # Finde waitForFirebaseReady Aufruf und füge danach ein, mit derselben Seite
+        for call in spec.calls(block, 'waitForFirebaseReady'):
+            args = spec.call_args(call)
+            if not args:
+                continue
+            indent = spec.indent_at(call.start)
+            inserts.append((spec.statement_end(call), f'\n{indent}await loginAsTestAdmin({args[0]});'))
+
+    if not inserts:
+        return None
+    if not ensure_helper_import(spec, 'loginAsTestAdmin'):
+        print(f'⚠️  {os.path.relpath(spec.path, base_path)}: kein require von ../helpers/firebase-helper'
+              f' - loginAsTestAdmin() nicht eingefügt')
+        return None
+
+    for offset, text in inserts:
+        spec.insert(offset, text)
+    return f'loginAsTestAdmin() zu {len(inserts)} afterEach() hinzugefügt'
+
+
+# Transforms dieses Skripts mit ihrem Namen im Codemod-Manifest
+transforms = [
+    ('run70-aftereach-auth', add_auth_to_aftereach)
+]
 
-for test_file in test_files:
-    file_path = os.path.join(base_path, test_file)
 
-    if not os.path.exists(file_path):
-        print(f'⚠️  Datei nicht gefunden: {test_file}')
-        continue
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='RUN #70: loginAsTestAdmin() in afterEach()')
+    parser.add_argument('--dry-run', action='store_true', help='nur anzeigen, nichts schreiben')
+    parser.add_argument('--force', action='store_true', help='Manifest ignorieren und alle Dateien prüfen')
+    parser.add_argument('--no-manifest', action='store_true', help='Manifest weder lesen noch schreiben')
+    parser.add_argument('--no-backup', action='store_true', help='Dateien vor dem Schreiben nicht sichern')
+    parser.add_argument('--profile', nargs='?', const=DEFAULT_PREFIX, default=None, metavar='PRÄFIX',
+                        help=f'cProfile + Phasen-Zeiten nach PRÄFIX.prof/.json (Standard: {DEFAULT_PREFIX})')
+    parser.add_argument('--all', action='store_true', help='alle Specs in integration/ und e2e/ ändern')
+    parser.add_argument('files', nargs='*', help='Spec-Dateien (ohne: --dry-run oder --all)')
+    args = parser.parse_args(argv)
+
+    if not args.files and not (args.all or args.dry_run):
+        parser.error('Dateien angeben oder --all (Änderungen vorher mit --dry-run prüfen)')
+
+    test_files = args.files or sorted(
+        p for pattern in test_globs for p in glob.glob(os.path.join(base_path, pattern)))
+
+    print('🔧 RUN #70: Fixe afterEach() Authentifizierungs-Problem\n')
+
+    manifest = None if args.no_manifest or args.dry_run else Manifest()
+    backup_run = None if args.no_backup or args.dry_run else BackupStore(repo_root).start_run('fix-aftereach-auth')
+
+    files_modified = []
+    files_skipped = []
+    files_cached = 0
+
+    profile = Profile('fix-aftereach-auth', args.profile) if args.profile else None
+    if profile is not None:
+        profile.start()
+
+    for file_path in test_files:
+        test_file = os.path.relpath(file_path, base_path)
+
+        if not os.path.exists(file_path):
+            print(f'⚠️  Datei nicht gefunden: {test_file}')
+            continue
+
+        # Manifest: Datei unverändert seit dem letzten Lauf des Fixes?
+        if manifest is not None:
+            current = all([manifest.is_current(file_path, name) for name, _ in transforms])
+            if current and not args.force:
+                files_cached += 1
+                continue
+
+        # afterEach() Auth in einem Durchlauf (ein Read, ein Write)
+        if profile is not None:
+            profile.count(file_path)
+        changed, notes = run_transforms(
+            file_path, [fn for _, fn in transforms], dry_run=args.dry_run,
+            before_write=backup_run.snapshot if backup_run else None,
+            timer=profile.timer if profile else None)
+
+        if manifest is not None:
+            for (name, _), note in zip(transforms, notes):
+                manifest.record(file_path, name, 'updated' if changed and note else 'skipped')
+
+        if changed:
+            print(f'📄 {test_file}')
+            for note in filter(None, notes):
+                print(f'   ✅ {note}')
+            files_modified.append(test_file)
+        else:
+            files_skipped.append(test_file)
 
-    print(f'📄 Verarbeite: {test_file}')
+    if profile is not None:
+        profile.stop()
 
-    # Schritt 1: Füge beforeAll() hinzu falls fehlend
-    beforeall_added = add_beforeall_if_missing(file_path)
-    if beforeall_added:
-        print(f'   ✅ beforeAll() Hook hinzugefügt')
-    else:
-        print(f'   ✓  beforeAll() bereits vorhanden')
+    print('\n' + '='*80)
+    print('ZUSAMMENFASSUNG' + (' (DRY RUN)' if args.dry_run else ''))
+    print('='*80)
+    print(f'✅ Dateien geändert: {len(files_modified)}')
+    for f in files_modified:
+        print(f'   - {f}')
 
-    # Schritt 2: Füge Auth zu afterEach() hinzu
-    aftereach_modified = add_auth_to_aftereach(file_path)
-    if aftereach_modified:
-        print(f'   ✅ loginAsTestAdmin() zu afterEach() hinzugefügt')
-        files_modified.append(test_file)
-    else:
-        print(f'   ✓  afterEach() hat bereits Auth oder keine Änderungen nötig')
-        files_skipped.append(test_file)
+    if files_skipped:
+        print(f'\n✓  Dateien übersprungen (keine Änderungen): {len(files_skipped)}')
+    if files_cached:
+        print(f'✓  Dateien unverändert laut Manifest: {files_cached}')
 
-    print()
+    if manifest is not None:
+        manifest.save()
+    if backup_run is not None and backup_run.save():
+        print(f'\n💾 Backup: {backup_run.id} - rückgängig mit:')
+        print(f'   python3 scripts/backup_store.py restore {backup_run.id}')
 
-print('\n' + '='*80)
-print('ZUSAMMENFASSUNG')
-print('='*80)
-print(f'✅ Dateien geändert: {len(files_modified)}')
-for f in files_modified:
-    print(f'   - {f}')
+    print('\n🎯 Nächster Schritt: Starte Tests neu mit:')
+    print('   npm test 2>&1 | tee test-output-RUN70.log')
+    return 0
 
-if files_skipped:
-    print(f'\n✓  Dateien übersprungen (keine Änderungen): {len(files_skipped)}')
-    for f in files_skipped:
-        print(f'   - {f}')
 
-print('\n🎯 Nächster Schritt: Starte Tests neu mit:')
-print('   cd "/Users/marcelgaertner/Desktop/Chritstopher Gàrtner /Marketing/06_Digitale_Tools/Fahrzeugannahme_App"')
-print('   npm test 2>&1 | tee test-output-RUN70.log')
+if __name__ == '__main__':
+    raise SystemExit(main())
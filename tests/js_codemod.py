@@ -0,0 +1,443 @@
+"""
+Kleine Codemod-Engine für Playwright Spec-Dateien.
+
+- Single-pass JS-Tokenizer: versteht Strings, Template-Literals (inkl. ${...}),
+  Regex-Literals und Kommentare. Klammern in Strings/Kommentaren zählen nicht.
+- Hook-Block-Index: test.describe / beforeAll / beforeEach / afterEach /
+  afterAll / test mit Offsets (Aufruf und Funktionsrumpf) und Eltern-Block.
+- SpecFile sammelt Edits gegen die Original-Offsets, so dass mehrere
+  Transforms auf denselben Index angewendet werden: ein Read, ein Write.
+
+Alle Offsets sind Zeichen-Offsets in den dekodierten Quelltext.
+"""
+
+import os
+import re
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from codemod_manifest import atomic_write_text
+
+Token = namedtuple('Token', 'kind start end')
+
+# Nach diesen Keywords beginnt ein '/' ein Regex-Literal, keine Division
+REGEX_KEYWORDS = frozenset([
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await'
+])
+
+HOOK_KINDS = frozenset(['describe', 'beforeAll', 'beforeEach', 'afterEach', 'afterAll'])
+TEST_MODIFIERS = frozenset(['only', 'skip', 'fixme', 'fail', 'slow'])
+DESCRIBE_MODIFIERS = frozenset(['only', 'skip', 'fixme', 'serial', 'parallel'])
+
+
+def _is_ident_char(ch):
+    return ch.isalnum() or ch in '_$' or ord(ch) > 127
+
+
+# Ein Token (bzw. Whitespace) ab der aktuellen Position; '/', '`' und '}'
+# brauchen Kontext und landen in 'other'
+TOKEN_RE = re.compile(r'''
+    (?P<ws>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^'\\\n]|\\(?:.|\Z))*(?:['\n]|\Z)|"(?:[^"\\\n]|\\(?:.|\Z))*(?:["\n]|\Z))
+  | (?P<number>\.?\d[\w$.\x80-\U0010ffff]*)
+  | (?P<ident>[\w$\x80-\U0010ffff]+)
+  | (?P<arrow>=>)
+  | (?P<other>.)
+''', re.DOTALL | re.VERBOSE)
+
+
+def tokenize(source):
+    """Zerlegt JS-Quelltext in Tokens.
+
+    kinds: 'ident', 'number', 'string', 'template', 'regex', 'comment', 'punct'.
+    Ein Template-Literal mit Ausdrücken liefert 'template'-Stücke, dazwischen
+    die normalen Tokens der ${...}-Ausdrücke.
+    """
+    tokens = []
+    n = len(source)
+    i = 0
+    # Stack offener '{': True = öffnet ein ${...} in einem Template-Literal
+    brace_stack = []
+    prev = None  # letztes signifikantes Token (kein Kommentar)
+
+    def regex_allowed():
+        if prev is None:
+            return True
+        if prev.kind in ('number', 'string', 'template', 'regex'):
+            return False
+        if prev.kind == 'ident':
+            return source[prev.start:prev.end] in REGEX_KEYWORDS
+        return source[prev.start:prev.end] not in (')', ']', '}')
+
+    def scan_template(pos):
+        """Scannt ab pos (nach ` oder }) bis zum schließenden ` oder ${"""
+        while pos < n:
+            ch = source[pos]
+            if ch == '\\':
+                pos += 2
+            elif ch == '`':
+                return pos + 1, False
+            elif ch == '$' and source.startswith('${', pos):
+                return pos + 2, True
+            else:
+                pos += 1
+        return n, False
+
+    while i < n:
+        m = TOKEN_RE.match(source, i)
+        kind = m.lastgroup
+        start = i
+        i = m.end()
+
+        if kind == 'ws':
+            continue
+        if kind == 'comment':
+            tokens.append(Token('comment', start, i))
+            continue
+
+        if kind in ('string', 'number', 'ident'):
+            tok = Token(kind, start, i)
+
+        elif kind == 'arrow':
+            tok = Token('punct', start, i)
+
+        else:
+            ch = source[start]
+            if ch == '`' or (ch == '}' and brace_stack and brace_stack[-1]):
+                if ch == '}':
+                    brace_stack.pop()
+                i, opens_expr = scan_template(start + 1)
+                if opens_expr:
+                    brace_stack.append(True)
+                tok = Token('template', start, i)
+
+            elif ch == '/' and regex_allowed():
+                j = start + 1
+                in_class = False
+                while j < n and source[j] != '\n':
+                    c = source[j]
+                    if c == '\\':
+                        j += 2
+                        continue
+                    if c == '[':
+                        in_class = True
+                    elif c == ']':
+                        in_class = False
+                    elif c == '/' and not in_class:
+                        break
+                    j += 1
+                if j < n and source[j] == '/':
+                    j += 1
+                    while j < n and _is_ident_char(source[j]):
+                        j += 1
+                    i = j
+                    tok = Token('regex', start, i)
+                else:
+                    tok = Token('punct', start, i)
+
+            else:
+                if ch == '{':
+                    brace_stack.append(False)
+                elif ch == '}' and brace_stack:
+                    brace_stack.pop()
+                tok = Token('punct', start, i)
+
+        tokens.append(tok)
+        prev = tok
+
+    return tokens
+
+
+@dataclass
+class Block:
+    """Ein test.describe / Hook / test() Aufruf im Quelltext"""
+    kind: str                 # 'describe', 'beforeAll', ..., 'test'
+    modifier: str             # z.B. 'skip', 'serial' oder ''
+    title: str                # erster String-Parameter (leer bei Hooks)
+    start: int                # Offset von 'test'
+    end: int                  # Offset hinter ')' bzw. ');'
+    body_start: int           # Offset hinter '{' des Callback-Rumpfs (-1 ohne Rumpf)
+    body_end: int             # Offset von '}' des Callback-Rumpfs (-1 ohne Rumpf)
+    parent: int = -1          # Index des umschließenden Blocks, -1 = Top-Level
+    children: list = field(default_factory=list)
+
+
+class SpecFile:
+    """Eine Spec-Datei: Quelltext, Tokens, Hook-Index und gesammelte Edits"""
+
+    def __init__(self, path, source=None):
+        self.path = path
+        if source is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+        self.source = source
+        self.tokens = tokenize(source)
+        # Signifikante Tokens (ohne Kommentare) für die Strukturanalyse
+        self.code = [t for t in self.tokens if t.kind != 'comment']
+        self._code_starts = [t.start for t in self.code]
+        self.blocks = self._index_blocks()
+        self.edits = []
+
+    # ------------------------------------------------------------------
+    # Index
+    # ------------------------------------------------------------------
+
+    def text(self, tok):
+        return self.source[tok.start:tok.end]
+
+    def _match_forward(self, k):
+        """Index des passenden schließenden Tokens zu code[k] ('(' '[' '{')"""
+        pairs = {'(': ')', '[': ']', '{': '}'}
+        opener = self.text(self.code[k])
+        closer = pairs[opener]
+        depth = 0
+        for j in range(k, len(self.code)):
+            tok = self.code[j]
+            if tok.kind != 'punct':
+                continue
+            t = self.text(tok)
+            if t == opener:
+                depth += 1
+            elif t == closer:
+                depth -= 1
+                if depth == 0:
+                    return j
+        return len(self.code) - 1
+
+    def _classify_call(self, k):
+        """Erkennt test(...), test.<hook>(...), test.<mod>(...), test.describe.<mod>(...)
+
+        Gibt (kind, modifier, index von '(') zurück oder None.
+        """
+        code = self.code
+        if k > 0 and self.text(code[k - 1]) == '.':
+            return None  # foo.test(...)
+        names = []
+        j = k + 1
+        while j + 1 < len(code) and self.text(code[j]) == '.' and code[j + 1].kind == 'ident':
+            names.append(self.text(code[j + 1]))
+            j += 2
+        if j >= len(code) or self.text(code[j]) != '(':
+            return None
+
+        if not names:
+            return 'test', '', j
+        if names[0] == 'describe':
+            mod = names[1] if len(names) > 1 else ''
+            if mod and mod not in DESCRIBE_MODIFIERS:
+                return None
+            return 'describe', mod, j
+        if len(names) == 1 and names[0] in HOOK_KINDS:
+            return names[0], '', j
+        if len(names) == 1 and names[0] in TEST_MODIFIERS:
+            return 'test', names[0], j
+        return None
+
+    def _callback_body(self, open_k, close_k):
+        """Sucht den Rumpf '{...}' des Callbacks innerhalb der Argumente"""
+        depth = 0
+        for j in range(open_k + 1, close_k):
+            t = self.text(self.code[j])
+            if t in ('(', '[', '{'):
+                if depth == 0 and t == '{' and self.text(self.code[j - 1]) in ('=>', ')'):
+                    return j, self._match_forward(j)
+                depth += 1
+            elif t in (')', ']', '}'):
+                depth -= 1
+        return None
+
+    def _index_blocks(self):
+        code = self.code
+        blocks = []
+        for k, tok in enumerate(code):
+            if tok.kind != 'ident' or self.text(tok) != 'test':
+                continue
+            call = self._classify_call(k)
+            if call is None:
+                continue
+            kind, modifier, open_k = call
+            close_k = self._match_forward(open_k)
+
+            title = ''
+            first = code[open_k + 1] if open_k + 1 < close_k else None
+            if kind in ('test', 'describe') and first is not None and first.kind in ('string', 'template'):
+                title = self.text(first)[1:-1]
+
+            body = self._callback_body(open_k, close_k)
+            # test.skip(cond) ohne Callback ist kein Test, sondern ein Aufruf im Test
+            if body is None and kind == 'test' and modifier:
+                continue
+
+            end = code[close_k].end
+            if close_k + 1 < len(code) and self.text(code[close_k + 1]) == ';':
+                end = code[close_k + 1].end
+
+            blocks.append(Block(
+                kind=kind, modifier=modifier, title=title,
+                start=tok.start, end=end,
+                body_start=code[body[0]].end if body else -1,
+                body_end=code[body[1]].start if body else -1
+            ))
+
+        # Eltern über Verschachtelung der Rümpfe bestimmen (Blocks sind nach start sortiert)
+        stack = []
+        for idx, block in enumerate(blocks):
+            while stack and not (blocks[stack[-1]].body_start <= block.start < blocks[stack[-1]].body_end):
+                stack.pop()
+            if stack:
+                block.parent = stack[-1]
+                blocks[stack[-1]].children.append(idx)
+            if block.body_start != -1:
+                stack.append(idx)
+        return blocks
+
+    # ------------------------------------------------------------------
+    # Abfragen
+    # ------------------------------------------------------------------
+
+    def find(self, kind, parent=None):
+        """Alle Blocks einer Art, optional nur direkte Kinder von parent (-1 = Top-Level)"""
+        return [b for b in self.blocks
+                if b.kind == kind and (parent is None or b.parent == parent)]
+
+    def describe_path(self, block):
+        """Titel der umschließenden describe-Blöcke, außen nach innen"""
+        path = []
+        while block.parent != -1:
+            block = self.blocks[block.parent]
+            if block.kind == 'describe':
+                path.append(block.title)
+        return list(reversed(path))
+
+    def body_tokens(self, block):
+        """Code-Tokens (ohne Kommentare) im Rumpf des Blocks"""
+        lo = bisect_left(self._code_starts, block.body_start)
+        hi = bisect_left(self._code_starts, block.body_end)
+        return self.code[lo:hi]
+
+    def calls(self, block, name):
+        """Tokens der Aufrufe name(...) im Rumpf (nicht in Strings/Kommentaren)"""
+        toks = self.body_tokens(block)
+        return [t for i, t in enumerate(toks)
+                if t.kind == 'ident' and self.text(t) == name
+                and i + 1 < len(toks) and self.text(toks[i + 1]) == '(']
+
+    def call_args(self, tok):
+        """Quelltext der Argumente des Aufrufs tok(...), z.B. ['page', "'/x'"]"""
+        k = bisect_left(self._code_starts, tok.start) + 1
+        if k >= len(self.code) or self.text(self.code[k]) != '(':
+            return []
+        close = self._match_forward(k)
+        args = []
+        depth = 0
+        start = k + 1
+        for j in range(k + 1, close + 1):
+            s = self.text(self.code[j])
+            if s in ('(', '[', '{'):
+                depth += 1
+            elif s in (')', ']', '}') and j != close:
+                depth -= 1
+            elif (s == ',' and depth == 0) or j == close:
+                if start < j:
+                    args.append(self.source[self.code[start].start:self.code[j - 1].end])
+                start = j + 1
+        return args
+
+    def statement_end(self, tok):
+        """Offset hinter dem Statement, das mit/nach tok beginnt (';' oder Zeilenende)"""
+        k = bisect_left(self._code_starts, tok.start)
+        depth = 0
+        for j in range(k, len(self.code)):
+            t = self.code[j]
+            s = self.text(t)
+            if s in ('(', '[', '{'):
+                depth += 1
+            elif s in (')', ']', '}'):
+                if depth == 0:
+                    return t.start
+                depth -= 1
+            elif s == ';' and depth == 0:
+                return t.end
+        return len(self.source)
+
+    def line_start(self, offset):
+        return self.source.rfind('\n', 0, offset) + 1
+
+    def indent_at(self, offset):
+        """Einrückung der Zeile, in der offset liegt"""
+        start = self.line_start(offset)
+        end = start
+        while end < len(self.source) and self.source[end] in ' \t':
+            end += 1
+        return self.source[start:end]
+
+    # ------------------------------------------------------------------
+    # Edits
+    # ------------------------------------------------------------------
+
+    def insert(self, offset, text):
+        self.edits.append((offset, offset, text))
+
+    def replace(self, start, end, text):
+        self.edits.append((start, end, text))
+
+    def apply(self):
+        """Wendet alle Edits auf den Original-Quelltext an und gibt das Ergebnis zurück"""
+        edits = sorted(self.edits, key=lambda e: (e[0], e[1]))
+        out = []
+        pos = 0
+        for start, end, text in edits:
+            if start < pos:
+                raise ValueError(f"Überlappende Edits in {self.path} bei Offset {start}")
+            out.append(self.source[pos:start])
+            out.append(text)
+            pos = end
+        out.append(self.source[pos:])
+        return ''.join(out)
+
+    def save(self, dry_run=False, before_write=None):
+        """Schreibt die Datei einmal zurück, falls Edits vorliegen. Gibt True bei Änderung zurück.
+
+        before_write(path) wird direkt vor dem Schreiben aufgerufen (z.B. für Backups).
+        """
+        if not self.edits:
+            return False
+        new_source = self.apply()
+        if new_source == self.source:
+            return False
+        if not dry_run:
+            if before_write is not None:
+                before_write(self.path)
+            # Temp-Datei + rename: ein abgebrochener Lauf hinterlässt keine halbe Spec
+            atomic_write_text(self.path, new_source)
+        return True
+
+
+def run_transforms(path, transforms, dry_run=False, before_write=None, timer=None):
+    """Liest path einmal, wendet alle Transforms an, schreibt einmal.
+
+    Ein Transform ist eine Funktion (SpecFile) -> Beschreibung oder None;
+    sie registriert ihre Änderungen über spec.insert()/spec.replace().
+    Gibt (geändert, [Beschreibung oder None je Transform]) zurück.
+
+    timer: optionaler codemod_profile.PhaseTimer (read, scan = Tokenizer +
+    Hook-Index, transform, write = Edits anwenden + schreiben).
+    """
+    phase = timer or (lambda name: nullcontext())
+    with phase('read'):
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+    with phase('scan'):
+        spec = SpecFile(path, source)
+    with phase('transform'):
+        notes = [transform(spec) for transform in transforms]
+    with phase('write'):
+        changed = spec.save(dry_run=dry_run, before_write=before_write)
+    return changed, notes
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Test-Inventar und Shard-Planer für die Playwright Specs
+
+Indexiert jeden Test in tests/integration, tests/e2e und tests/smoke
+(Datei, Zeile, describe-Pfad, aktive Hooks) über die Codemod-Engine
+(js_codemod.py), liest Laufzeiten aus Playwright JSON-Reports und verteilt
+die Tests per LPT (Longest Processing Time first) auf N Shards.
+
+Aufruf:
+    python3 tests/spec-inventory.py list [--report R.json ...] [--json]
+    python3 tests/spec-inventory.py shards -n 4 [--report R.json ...] [--unit test|file] [--json]
+    python3 tests/spec-inventory.py shards -n 4 --shard 2
+        -> gibt die Argumente für Shard 2 aus:
+           npx playwright test $(python3 tests/spec-inventory.py shards -n 4 --shard 2)
+
+Ist der Shard leer (mehr Shards als Einheiten), gibt --shard einen Filter
+ohne Treffer aus und endet mit Exit-Code 1, damit Playwright nicht
+stillschweigend die ganze Suite startet.
+
+Ohne --report wird test-results/results.json verwendet (falls vorhanden).
+Tests ohne gemessene Laufzeit bekommen den Median ihrer Datei, sonst den
+globalen Median. test.describe.serial-Blöcke bleiben als Einheit zusammen.
+"""
+
+import argparse
+import glob
+import heapq
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+
+from js_codemod import SpecFile
+
+# Basis-Pfad (Verzeichnis dieses Skripts = Playwright testDir)
+base_path = os.path.dirname(os.path.abspath(__file__))
+repo_root = os.path.dirname(base_path)
+
+spec_globs = [
+    'integration/*.spec.js',
+    'e2e/*.spec.js',
+    'smoke/*.spec.js'
+]
+
+default_report = os.path.join(repo_root, 'test-results', 'results.json')
+
+# Laufzeit in ms für Tests ohne jede Messung
+fallback_duration_ms = 10000
+
+# Ausgabe von --shard für einen leeren Shard: Datei-Filter ohne Treffer
+empty_shard_filter = '__leerer-shard__'
+
+
+def line_of(spec, offset):
+    return spec.source.count('\n', 0, offset) + 1
+
+
+def index_spec(file_path):
+    """Alle Tests einer Spec-Datei als dicts"""
+    spec = SpecFile(file_path)
+    rel = os.path.relpath(file_path, base_path).replace(os.sep, '/')
+    tests = []
+
+    for block in spec.blocks:
+        if block.kind != 'test':
+            continue
+
+        # Hooks der Datei-Ebene und aller umschließenden describe-Blöcke
+        hooks = []
+        serial = None
+        parent = block.parent
+        scopes = [-1]
+        while parent != -1:
+            scopes.append(parent)
+            if spec.blocks[parent].modifier == 'serial':
+                serial = parent
+            parent = spec.blocks[parent].parent
+        for scope in reversed(scopes):
+            for b in spec.blocks:
+                if b.parent == scope and b.kind not in ('test', 'describe') and b.kind not in hooks:
+                    hooks.append(b.kind)
+
+        tests.append({
+            'file': rel,
+            'line': line_of(spec, block.start),
+            'describe': spec.describe_path(block),
+            'title': block.title,
+            'modifier': block.modifier,
+            'hooks': hooks,
+            # Serielle describe-Blöcke laufen in einem Worker zusammen
+            'group': f'{rel}:{line_of(spec, spec.blocks[serial].start)}' if serial is not None else None
+        })
+
+    return tests
+
+
+def load_inventory():
+    files = sorted(p for pattern in spec_globs for p in glob.glob(os.path.join(base_path, pattern)))
+    tests = []
+    for file_path in files:
+        tests.extend(index_spec(file_path))
+    return tests
+
+
+def _walk_suites(suites, path, durations):
+    for suite in suites:
+        # Oberste Suite = Datei, darunter describe-Blöcke
+        title = suite.get('title', '')
+        sub_path = path + [title] if path is not None else []
+        for spec in suite.get('specs', []):
+            file_rel = spec.get('file') or suite.get('file', '')
+            file_rel = file_rel.replace(os.sep, '/')
+            if file_rel.startswith('tests/'):
+                file_rel = file_rel[len('tests/'):]
+            for test in spec.get('tests', []):
+                for result in test.get('results', []):
+                    if 'duration' in result:
+                        key = (file_rel, tuple(sub_path), spec.get('title', ''))
+                        durations[key].append(result['duration'])
+        _walk_suites(suite.get('suites', []), sub_path, durations)
+
+
+def load_durations(report_paths):
+    """{(datei, describe-pfad, titel): [ms, ...]} aus Playwright JSON-Reports"""
+    durations = defaultdict(list)
+    for report_path in report_paths:
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        # path=None: die oberste Ebene (Datei-Suite) zählt nicht zum describe-Pfad
+        for file_suite in report.get('suites', []):
+            _walk_suites([file_suite], None, durations)
+    return durations
+
+
+def attach_durations(tests, durations):
+    """Setzt test['duration_ms'] und test['measured']"""
+    per_file = defaultdict(list)
+    for test in tests:
+        key = (test['file'], tuple(test['describe']), test['title'])
+        if durations.get(key):
+            test['duration_ms'] = statistics.mean(durations[key])
+            test['measured'] = True
+            per_file[test['file']].append(test['duration_ms'])
+
+    measured = [d for ds in per_file.values() for d in ds]
+    global_median = statistics.median(measured) if measured else fallback_duration_ms
+    for test in tests:
+        if 'duration_ms' not in test:
+            known = per_file.get(test['file'])
+            test['duration_ms'] = statistics.median(known) if known else global_median
+            test['measured'] = False
+
+
+def build_units(tests, unit):
+    """Planungseinheiten: einzelne Tests, serielle Gruppen oder ganze Dateien"""
+    units = defaultdict(lambda: {'duration_ms': 0, 'tests': []})
+    for test in tests:
+        if test['modifier'] in ('skip', 'fixme'):
+            continue
+        if unit == 'file':
+            key = test['file']
+        else:
+            key = test['group'] or f"{test['file']}:{test['line']}"
+        units[key]['duration_ms'] += test['duration_ms']
+        units[key]['tests'].append(test)
+    return units
+
+
+def plan_shards(units, shard_count):
+    """LPT: größte Einheit zuerst auf den aktuell leichtesten Shard"""
+    shards = [{'duration_ms': 0, 'units': []} for _ in range(shard_count)]
+    heap = [(0, i) for i in range(shard_count)]
+    for key, unit in sorted(units.items(), key=lambda kv: (-kv[1]['duration_ms'], kv[0])):
+        load, i = heapq.heappop(heap)
+        shards[i]['units'].append(key)
+        shards[i]['duration_ms'] += unit['duration_ms']
+        heapq.heappush(heap, (shards[i]['duration_ms'], i))
+    for shard in shards:
+        shard['units'].sort()
+    return shards
+
+
+def _fmt_s(ms):
+    return f'{ms / 1000:.1f}s'
+
+
+def cmd_list(args, tests):
+    if args.json:
+        print(json.dumps(tests, indent=2, ensure_ascii=False))
+        return 0
+
+    by_file = defaultdict(list)
+    for test in tests:
+        by_file[test['file']].append(test)
+    for file_rel, file_tests in by_file.items():
+        total = sum(t['duration_ms'] for t in file_tests)
+        print(f'📄 {file_rel}  ({len(file_tests)} Tests, {_fmt_s(total)})')
+        for t in file_tests:
+            mark = '' if t['measured'] else ' ~'
+            path = ' › '.join(t['describe'] + [t['title']])
+            print(f"   {t['line']:>5}  {_fmt_s(t['duration_ms']):>7}{mark}  {path}")
+    measured = sum(1 for t in tests if t['measured'])
+    print(f'\n✅ {len(tests)} Tests in {len(by_file)} Dateien, {measured} mit gemessener Laufzeit (~ = geschätzt)')
+    return 0
+
+
+def cmd_shards(args, tests):
+    units = build_units(tests, args.unit)
+    shards = plan_shards(units, args.shards)
+
+    if args.shards > len(units):
+        print(f'⚠️  -n {args.shards} ist größer als die Zahl der Einheiten ({len(units)}): '
+              f'{args.shards - len(units)} Shards bleiben leer', file=sys.stderr)
+
+    if args.shard:
+        # Nur die CLI-Argumente für einen Shard (1-basiert), für $(...) in CI
+        shard_units = shards[args.shard - 1]['units']
+        if not shard_units:
+            # Leere Ausgabe hieße für `npx playwright test $(...)`: alle Tests.
+            # Stattdessen ein Filter, der nichts trifft, und Exit-Code 1.
+            print(f'❌ Shard {args.shard} ist leer', file=sys.stderr)
+            print(empty_shard_filter)
+            return 1
+        print(' '.join(shard_units))
+        return 0
+
+    if args.json:
+        print(json.dumps({'unit': args.unit, 'shards': shards}, indent=2, ensure_ascii=False))
+        return 0
+
+    total = sum(s['duration_ms'] for s in shards)
+    print(f'⚖️  {len(units)} Einheiten ({args.unit}) auf {args.shards} Shards, Summe {_fmt_s(total)}\n')
+    for i, shard in enumerate(shards, 1):
+        print(f"Shard {i}: {_fmt_s(shard['duration_ms']):>8}  {len(shard['units'])} Einheiten")
+    longest = max(s['duration_ms'] for s in shards)
+    ideal = total / args.shards if args.shards else 0
+    print(f'\n🎯 Längster Shard {_fmt_s(longest)} (Ideal {_fmt_s(ideal)})')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Test-Inventar und Shard-Planer für Playwright')
+    parser.add_argument('--report', action='append', default=None,
+                        help='Playwright JSON-Report (mehrfach möglich, Standard: test-results/results.json)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_list = sub.add_parser('list', help='alle Tests mit describe-Pfad, Hooks und Laufzeit')
+    p_list.add_argument('--json', action='store_true')
+
+    p_shards = sub.add_parser('shards', help='Tests per LPT auf N Shards verteilen')
+    p_shards.add_argument('-n', '--shards', type=int, required=True)
+    p_shards.add_argument('--unit', choices=['test', 'file'], default='test',
+                          help='test: einzelne Tests (datei:zeile), file: ganze Dateien')
+    p_shards.add_argument('--shard', type=int, help='nur die Argumente für diesen Shard (1-basiert) ausgeben')
+    p_shards.add_argument('--json', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command == 'shards' and not 1 <= (args.shard or 1) <= args.shards:
+        parser.error('--shard muss zwischen 1 und -n liegen')
+
+    reports = args.report or ([default_report] if os.path.exists(default_report) else [])
+    tests = load_inventory()
+    attach_durations(tests, load_durations(reports))
+
+    if args.command == 'list':
+        return cmd_list(args, tests)
+    return cmd_shards(args, tests)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())